@@ -20,44 +20,117 @@ Requirements:
 """
 
 import fitz  # PyMuPDF
+import asyncio
 import json
+import orjson
 import os
 import sys
 import uuid
 import re
+import hashlib
+import sqlite3
 import subprocess
 import cv2
 import numpy as np
 from pathlib import Path
+from collections import defaultdict
+from collections.abc import Mapping, MutableMapping
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from typing import Dict, Any, Tuple, List, Optional
 from supabase import create_client, Client
 from dotenv import load_dotenv
 import anthropic
-import requests
+import httpx
+from tqdm import tqdm
 import time
 
 # Load environment variables
 load_dotenv()
 
+
+def get_max_workers(kind: str) -> int:
+    """Worker count for a pool, sized to this host by what bounds the work:
+    "cpu" (processes doing CPU work; past ~6 they stop helping), "io_disk" (local file I/O) or "io_net" (HTTP requests)"""
+    cpu = os.cpu_count() or 1
+    if kind == "cpu":
+        return min(cpu, 6)
+    if kind == "io_disk":
+        return min(cpu, 8)
+    if kind == "io_net":
+        return min(cpu * 4, 16)
+    raise ValueError(f"Unknown worker kind: {kind}")
+
+
 # Configuration
 SUPABASE_URL = os.getenv('SUPABASE_URL')
-SUPABASE_KEY = os.getenv('SUPABASE_ANON_KEY')
+SUPABASE_SERVICE_ROLE_KEY = os.getenv('SUPABASE_SERVICE_ROLE_KEY')  # Needed for the pipeline RPCs in sql/ (not executable with the anon key)
+SUPABASE_KEY = SUPABASE_SERVICE_ROLE_KEY or os.getenv('SUPABASE_ANON_KEY')
 BUCKET_NAME = os.getenv('BUCKET_NAME', 'banditsassets4')
 ANTHROPIC_API_KEY = os.getenv('ANTHROPIC_API_KEY')
 DEEPSEEK_API_KEY = os.getenv('DEEPSEEK_API_KEY')  # For DeepSeek API
 GOOGLE_MAPS_API_KEY = os.getenv('GOOGLE_MAPS_API_KEY')  # For geocoding
+SUPABASE_DB_URL = os.getenv('SUPABASE_DB_URL')  # Direct Postgres connection string, for INGEST_METHOD = "copy"
 
 # Pipeline settings
 DRY_RUN = False
 EMPTY_BUCKET_BEFORE_UPLOAD = True  # Set to True to empty bucket, False to reuse existing images
 MAX_BANDITS = 500  # Maximum number of bandits to process
+INSERT_BATCH_SIZE = 500  # Rows per bulk insert request
+INSERT_WORKERS = 8  # Concurrent bulk insert requests per table
+INSERT_RETRIES = 5  # Attempts per insert request on transient errors (timeouts, 429, 5xx), with exponential backoff
+# How insert_to_database writes rows:
+#   "rest" - chunked bulk REST inserts (default)
+#   "rpc"  - one transaction via the ingest_bandits_events RPC (sql/ingest_bandits_events.sql; needs SUPABASE_SERVICE_ROLE_KEY)
+#   "copy" - one transaction of COPY ... FROM STDIN over a direct Postgres connection (SUPABASE_DB_URL)
+INGEST_METHOD = "rest"
+# Set FULL_REFRESH=0 to upsert only new/changed rows into the existing tables instead of truncating
+# (INGEST_METHOD = "rest" only; rows no longer in the document are kept; needs sql/pipeline_natural_keys.sql)
+FULL_REFRESH = os.getenv("FULL_REFRESH", "1") == "1"
+VERBOSE = os.getenv("VERBOSE") == "1"  # Set VERBOSE=1 to log every inserted row
+VERBOSE_STATS = os.getenv("VERBOSE_STATS", "1") == "1"  # Set VERBOSE_STATS=0 to print only counts in the statistics report
 
 # Geocoding settings
-GEOCODING_CACHE_FILE = "geocoding_cache.json"  # Cache file for geocoding results
+GEOCODING_CACHE_FILE = "geocoding_cache.json"  # Legacy JSON cache, imported into the SQLite cache on first use
+GEOCODING_CACHE_DB = "geocoding_cache.db"  # SQLite cache of geocoding results keyed by lowercased address
 USE_FREE_GEOCODING = True  # Use free Nominatim service instead of Google Maps
+NOMINATIM_URL = "https://nominatim.openstreetmap.org/search"
+NOMINATIM_HEADERS = {'User-Agent': 'BanditsApp/1.0 (geocoding for Athens events)'}
+GOOGLE_GEOCODE_URL = "https://maps.googleapis.com/maps/api/geocode/json"
+
+# Storage settings
+IMAGE_FOLDERS = ["pdf_images/", "vision_images/"]  # Bucket folders holding pipeline images
+REMOVE_BATCH_SIZE = 1000  # Paths per storage remove request
+UPLOAD_CONCURRENCY = get_max_workers("io_net")  # Concurrent image uploads
+UPLOAD_CHUNK_SIZE = 64 * 1024  # Bytes read per step when streaming an image file to storage
+WRITE_WORKERS = get_max_workers("io_disk")  # Threads writing bandit images to local disk
+
+# PDF extraction settings
+PAGE_WORKERS = get_max_workers("cpu")  # Worker processes for page extraction
+EXTRACTION_CACHE_FILE = "extraction_cache.json"  # Per-page extraction results in the output dir, keyed by PDF path, mtime and size
+USE_EXTRACTION_CACHE = True  # Reuse the extracted pages while the PDF is unchanged instead of parsing it again
+# Bump whenever extract_pages output changes (clean_text, its regexes, TEXT_ONLY_FLAGS, page_image_blocks)
+# so pages cached by the old code are extracted again
+EXTRACTION_FORMAT_VERSION = 1
+
+# Face detection settings
+FACE_CACHE_FILE = ".face_cache.db"  # SQLite cache of face detection results keyed by image hash
+FACE_DETECTOR = "haar"  # "haar" (bundled with OpenCV) or "yunet" (int8 DNN, several times faster; needs YUNET_MODEL_FILE)
+YUNET_MODEL_FILE = "face_detection_yunet_2023mar_int8.onnx"  # From opencv_zoo models/face_detection_yunet
+FACE_WORKERS = get_max_workers("cpu")  # Worker processes for face detection
+MIN_FACE_IMAGE_BYTES = 20000  # Smaller embedded images are thumbnails used as-is, without face detection
+DETECTION_MAX_DIM = 400  # Longest side (px) images are downscaled to before face detection
+# Bump whenever detection results change (DETECTION_MAX_DIM, detector parameters, find_largest_face)
+# so boxes and "no face" verdicts cached by the old detector are not reused
+FACE_DETECTION_VERSION = 2
 
 # AI Model settings
 USE_DEEPSEEK = False  # Set to True to use DeepSeek instead of Claude
+DEEPSEEK_MAX_CONCURRENT = 10  # Concurrent DeepSeek chunk requests
+DEEPSEEK_MAX_RETRIES = 5  # Retries per request on timeouts/429/5xx (1s, 2s, 4s, ... backoff)
+CLAUDE_MAX_CONCURRENT = 4  # Concurrent Claude chunk requests
+DEEPSEEK_CACHE_DIR = "ai_cache"  # Per-request DeepSeek responses, one file per SHA-256 of the request body
 AI_CACHE_FILE = "ai_cache.json"  # Cache file for AI processing results
 USE_AI_CACHE = True  # Set to True to use cached AI results instead of making API calls
 
@@ -66,12 +139,525 @@ supabase: Client = None
 if SUPABASE_URL and SUPABASE_KEY:
     supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
 
-ai_client = None
-if USE_DEEPSEEK and DEEPSEEK_API_KEY:
-    ai_client = requests  # DeepSeek uses direct HTTP requests
-elif ANTHROPIC_API_KEY:
+    # Swap PostgREST's default session for one keep-alive HTTP/2 pool sized for the concurrent
+    # bulk inserts, so every batch reuses the same TLS connections instead of cycling them
+    _default_session = supabase.postgrest.session
+    supabase.postgrest.session = httpx.Client(
+        base_url=_default_session.base_url,
+        headers=_default_session.headers,
+        timeout=_default_session.timeout,
+        http2=True,
+        limits=httpx.Limits(max_connections=2 * INSERT_WORKERS, max_keepalive_connections=2 * INSERT_WORKERS,
+                            keepalive_expiry=60),
+    )
+    _default_session.close()
+
+ai_client = None  # Anthropic client; DeepSeek requests go through their own httpx.AsyncClient (call_deepseek_batch)
+if ANTHROPIC_API_KEY and not USE_DEEPSEEK:
     ai_client = anthropic.Anthropic(api_key=ANTHROPIC_API_KEY)
 
+# Row schemas: (column, key in the AI output, default used when the value is missing or empty)
+BANDIT_FIELDS = (
+    ("name", "name", None),
+    ("age", "age", None),
+    ("city", "city", None),
+    ("occupation", "occupation", None),
+    ("rating", "rating", 0),
+    ("image_url", "image_url", None),
+    ("description", "description", None),
+    ("family_name", "family_name", None),
+)
+EVENT_FIELDS = (
+    ("name", "name", None),
+    ("genre", "genre", None),
+    ("description", "description", None),
+    ("rating", "rating", 0),
+    ("image_url", "image_url", None),
+    ("link", "link", None),
+    ("address", "address", None),
+    ("city", "city", None),
+    ("neighborhood", "neighborhood", None),
+    ("start_time", "start_time", "2024-01-01T18:00:00Z"),
+    ("end_time", "end_time", "2024-01-01T23:00:00Z"),
+    ("timing_info", "timing_info", ""),
+    ("location_lat", "latitude", None),
+    ("location_lng", "longitude", None),
+    ("image_gallery", "image_gallery", None),
+)
+
+# Column order used when streaming rows with COPY
+BANDIT_COLUMNS = ("id",) + tuple(column for column, _, _ in BANDIT_FIELDS)
+EVENT_COLUMNS = ("id",) + tuple(column for column, _, _ in EVENT_FIELDS)
+RELATIONSHIP_COLUMNS = ("id", "bandit_id", "event_id", "personal_tip")
+
+# Natural key of each table, backed by UNIQUE constraints (sql/pipeline_natural_keys.sql) for incremental upserts
+NATURAL_KEYS = {
+    "bandit": ("name", "family_name"),
+    "event": ("name", "start_time", "address"),
+    "bandit_event": ("bandit_id", "event_id"),
+}
+
+# Column types, so prepared values compare equal to what PostgREST returns for them
+# ("2024-01-01T18:00:00Z" is read back as "2024-01-01T18:00:00+00:00", an age of "32" as 32)
+TIMESTAMP_COLUMNS = {"start_time", "end_time"}
+INTEGER_COLUMNS = {"age", "rating"}
+FLOAT_COLUMNS = {"location_lat", "location_lng"}
+
+# Per-row logging helper: a no-op unless VERBOSE is enabled
+vprint = print if VERBOSE else (lambda *args, **kwargs: None)
+
+
+def generate_uuids(count: int) -> List[str]:
+    """Generate `count` random UUIDv4 strings from a single os.urandom read"""
+    raw = os.urandom(16 * count)
+    return [str(uuid.UUID(bytes=raw[i:i + 16], version=4)) for i in range(0, 16 * count, 16)]
+
+
+def is_transient_error(error: Exception) -> bool:
+    """True for errors worth retrying: network failures/timeouts and 429/5xx responses"""
+    if isinstance(error, httpx.TransportError):
+        return True
+    # postgrest's APIError carries the HTTP status as its code when the body isn't a PostgREST error
+    return str(getattr(error, "code", "")) in ("429", "500", "502", "503", "504")
+
+
+def call_with_retries(func, *args, attempts: int = INSERT_RETRIES, **kwargs):
+    """Call func, retrying transient errors with exponential backoff (0.2s, 0.4s, ... capped at 5s)"""
+    delay = 0.2
+    for attempt in range(1, attempts + 1):
+        try:
+            return func(*args, **kwargs)
+        except Exception as e:
+            if attempt == attempts or not is_transient_error(e):
+                raise
+            print(f"   ⏳ Transient error ({str(e)}), retrying in {delay:.1f}s (attempt {attempt}/{attempts})...")
+            time.sleep(delay)
+            delay = min(delay * 2, 5)
+
+
+def project_row(src: Dict[str, Any], fields: Tuple[Tuple[str, str, Any], ...]) -> Dict[str, Any]:
+    """Build a database row from an AI output record following a BANDIT_FIELDS/EVENT_FIELDS spec"""
+    row = {}
+    for column, key, default in fields:
+        value = src.get(key)
+        row[column] = value if value or default is None else default
+    return row
+
+
+def normalize_value(column: str, value: Any) -> Any:
+    """Convert a value to the type Postgres stores in the column (aware datetime, int or float) for comparisons.
+    Values that don't parse are returned unchanged."""
+    if value is None:
+        return None
+    try:
+        if column in TIMESTAMP_COLUMNS:
+            timestamp = datetime.fromisoformat(value.replace("Z", "+00:00")) if isinstance(value, str) else value
+            return timestamp if timestamp.tzinfo else timestamp.replace(tzinfo=timezone.utc)  # Supabase sessions run in UTC
+        if column in INTEGER_COLUMNS:
+            return int(value)
+        if column in FLOAT_COLUMNS:
+            return float(value)
+    except (TypeError, ValueError, AttributeError):
+        pass
+    return value
+
+
+def natural_key(row: Dict[str, Any], columns: Tuple[str, ...]) -> Tuple:
+    """A row's natural key with typed values, equal for a prepared row and its stored copy"""
+    return tuple(normalize_value(column, row.get(column)) for column in columns)
+
+
+# Face detection runs in worker processes, so its helpers live at module level (picklable)
+# and each process opens its own connection to the face cache.
+_face_cache: Optional[sqlite3.Connection] = None
+
+
+def get_face_cache() -> sqlite3.Connection:
+    """Open this process's connection to the on-disk face detection cache (created on first use)"""
+    global _face_cache
+    if _face_cache is None:
+        _face_cache = sqlite3.connect(FACE_CACHE_FILE, timeout=30, check_same_thread=False)
+        _face_cache.execute("PRAGMA journal_mode=WAL")
+        _face_cache.execute(
+            "CREATE TABLE IF NOT EXISTS faces (hash TEXT PRIMARY KEY, x INT, y INT, w INT, h INT, ok INT)"
+        )
+        _face_cache.execute(
+            "CREATE TABLE IF NOT EXISTS faces_phash (phash TEXT PRIMARY KEY, x INT, y INT, w INT, h INT, ok INT)"
+        )
+    return _face_cache
+
+
+def perceptual_hash(img: np.ndarray) -> str:
+    """Size-qualified average hash of a decoded image: identical for re-encoded copies of the same picture"""
+    img_height, img_width = img.shape[:2]
+    thumbnail = cv2.resize(cv2.cvtColor(img, cv2.COLOR_BGR2GRAY), (16, 16), interpolation=cv2.INTER_AREA)
+    return f"{img_width}x{img_height}:{np.packbits(thumbnail > thumbnail.mean()).tobytes().hex()}"
+
+
+_face_cascade: Optional[cv2.CascadeClassifier] = None
+
+
+def get_face_cascade() -> cv2.CascadeClassifier:
+    """Return this process's Haar cascade, parsing the XML file only on first use"""
+    global _face_cascade
+    if _face_cascade is None:
+        _face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+    return _face_cascade
+
+
+_yunet_detector: Optional[cv2.FaceDetectorYN] = None
+
+
+def get_yunet_detector() -> Optional[cv2.FaceDetectorYN]:
+    """Return this process's YuNet detector when FACE_DETECTOR is "yunet" and the model file exists, else None"""
+    global _yunet_detector
+    if _yunet_detector is None and FACE_DETECTOR == "yunet" and Path(YUNET_MODEL_FILE).exists():
+        _yunet_detector = cv2.FaceDetectorYN.create(YUNET_MODEL_FILE, "", (320, 320),
+                                                    score_threshold=0.6, nms_threshold=0.3, top_k=5)
+    return _yunet_detector
+
+
+def find_largest_face(img: np.ndarray) -> Optional[Tuple[int, int, int, int]]:
+    """Run the face detector and return the largest plausible face as (x, y, w, h)"""
+    img_height, img_width = img.shape[:2]
+    yunet_detector = get_yunet_detector()
+
+    # Detect on a downscaled copy (detector cost grows with pixel count), then map back to full-size coordinates
+    scale = min(1.0, DETECTION_MAX_DIM / max(img_width, img_height))
+    small = cv2.resize(img, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA) if scale < 1.0 else img
+
+    if yunet_detector is not None:
+        yunet_detector.setInputSize((small.shape[1], small.shape[0]))
+        _, detections = yunet_detector.detect(small)
+        faces = [] if detections is None else [detection[:4] for detection in detections]
+    else:
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        face_cascade = get_face_cascade()
+
+        # Use improved face detection parameters
+        faces = face_cascade.detectMultiScale(
+            gray,
+            scaleFactor=1.02,  # More sensitive
+            minNeighbors=2,    # More sensitive
+            minSize=(15, 15)   # Smaller minimum size
+        )
+
+    if len(faces) == 0:
+        return None
+
+    # Get largest face
+    largest_face = max(faces, key=lambda x: x[2] * x[3])
+    x, y, w, h = (int(v / scale) for v in largest_face)
+
+    # Validate face size
+    face_area_percentage = (w * h) / (img_width * img_height) * 100
+    if face_area_percentage < 0.5 or face_area_percentage > 60:
+        return None
+
+    return x, y, w, h
+
+
+def crop_face(image_data: bytes) -> Tuple[bytes, bool]:
+    """Improved face detection and cropping algorithm (detection results are cached by image hash)"""
+    # Tiny thumbnails aren't worth decoding
+    if len(image_data) < MIN_FACE_IMAGE_BYTES:
+        return image_data, False
+
+    try:
+        face_cache = get_face_cache()
+        # Keys carry the detection version and detector, so results from other detector settings are never mixed in
+        key_prefix = f"v{FACE_DETECTION_VERSION}:{'yunet' if get_yunet_detector() is not None else 'haar'}:"
+        image_hash = key_prefix + hashlib.blake2b(image_data, digest_size=16).hexdigest()
+        cached = face_cache.execute(
+            "SELECT x, y, w, h, ok FROM faces WHERE hash = ?", (image_hash,)
+        ).fetchone()
+
+        # Known to have no usable face - skip decoding entirely
+        if cached is not None and not cached[4]:
+            return image_data, False
+
+        nparr = np.frombuffer(image_data, np.uint8)
+        img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+        
+        if img is None:
+            return image_data, False
+        
+        img_height, img_width = img.shape[:2]
+
+        if cached is None:
+            # Not seen byte-for-byte; a re-encoded copy of a known image (same size and thumbnail) reuses its result
+            phash = key_prefix + perceptual_hash(img)
+            cached = face_cache.execute(
+                "SELECT x, y, w, h, ok FROM faces_phash WHERE phash = ?", (phash,)
+            ).fetchone()
+            if cached is None:
+                face = find_largest_face(img)
+                cached = (*(face or (0, 0, 0, 0)), int(face is not None))
+                with face_cache:
+                    face_cache.execute("INSERT OR REPLACE INTO faces_phash VALUES (?, ?, ?, ?, ?, ?)", (phash, *cached))
+            with face_cache:
+                face_cache.execute("INSERT OR REPLACE INTO faces VALUES (?, ?, ?, ?, ?, ?)", (image_hash, *cached))
+            if not cached[4]:
+                return image_data, False
+        x, y, w, h = cached[:4]
+        
+        # Calculate face center
+        face_center_x = x + w // 2
+        face_center_y = y + h // 2
+        
+        # Create square crop centered on face
+        face_size = max(w, h)
+        padding_factor = 2.0
+        crop_size = int(face_size * padding_factor)
+        crop_size = min(crop_size, min(img_width, img_height))
+        
+        half_crop = crop_size // 2
+        crop_left = max(0, face_center_x - half_crop)
+        crop_right = min(img_width, face_center_x + half_crop)
+        crop_top = max(0, face_center_y - half_crop)
+        crop_bottom = min(img_height, face_center_y + half_crop)
+        
+        # Adjust boundaries if needed
+        if crop_right - crop_left < crop_size:
+            if crop_left == 0:
+                crop_right = min(img_width, crop_size)
+            else:
+                crop_left = max(0, img_width - crop_size)
+        
+        if crop_bottom - crop_top < crop_size:
+            if crop_top == 0:
+                crop_bottom = min(img_height, crop_size)
+            else:
+                crop_top = max(0, img_height - crop_size)
+        
+        if crop_left >= crop_right or crop_top >= crop_bottom:
+            return image_data, False
+        
+        # The crop covers the whole image - keep the original bytes instead of re-encoding (a face was still found)
+        if crop_left == 0 and crop_top == 0 and crop_right == img_width and crop_bottom == img_height:
+            return image_data, True
+        
+        # Perform crop
+        cropped_img = img[crop_top:crop_bottom, crop_left:crop_right]
+        success, encoded_img = cv2.imencode('.jpg', cropped_img,
+                                            [cv2.IMWRITE_JPEG_QUALITY, 85, cv2.IMWRITE_JPEG_OPTIMIZE, 1])
+        
+        if success:
+            return encoded_img.tobytes(), True
+        else:
+            return image_data, False
+            
+    except Exception as e:
+        print(f"⚠️  Error in improved face detection: {str(e)}")
+        return image_data, False
+
+
+def detect_and_crop_face(item: Tuple[str, bytes]) -> Tuple[str, bytes, bool]:
+    """Process-pool entry point: crop one (placeholder_id, image_data) pair"""
+    placeholder_id, image_data = item
+    processed_data, face_detected = crop_face(image_data)
+    return placeholder_id, processed_data, face_detected
+
+
+def warn_if_face_detector_missing():
+    """Tell the user when the configured YuNet model isn't available and Haar is used instead"""
+    if FACE_DETECTOR == "yunet" and not Path(YUNET_MODEL_FILE).exists():
+        print(f"⚠️  {YUNET_MODEL_FILE} not found, using the Haar cascade for face detection")
+
+
+def detect_and_crop_faces(images: Dict[str, bytes]) -> Dict[str, Tuple[bytes, bool]]:
+    """Run face detection and cropping over many images in parallel worker processes"""
+    warn_if_face_detector_missing()
+    if len(images) <= 1:
+        results = list(map(detect_and_crop_face, images.items()))
+    else:
+        with ProcessPoolExecutor(max_workers=FACE_WORKERS) as executor:
+            results = list(executor.map(detect_and_crop_face, images.items(), chunksize=4))
+    return {placeholder_id: (data, ok) for placeholder_id, data, ok in results}
+
+
+class AsyncRateLimiter:
+    """Spaces out request start times by at least `interval` seconds"""
+    
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.next_slot = 0.0
+    
+    async def wait(self):
+        # No await between reading and reserving the slot, so concurrent tasks never get the same one
+        now = time.monotonic()
+        slot = max(now, self.next_slot)
+        self.next_slot = slot + self.interval
+        await asyncio.sleep(slot - now)
+
+
+# clean_text patterns, compiled once. Non-readable characters go first: removing them can join a "|]=[" marker
+# back together. The marker and disallowed punctuation then share one pass (a "●" + zero-width space pair
+# is already covered by these two).
+UNREADABLE_CHARS_PATTERN = re.compile(r'[^\x00-\x7F\u00A0-\uFFFF]|[\u200B-\u200D\uFEFF]')
+DISALLOWED_CHARS_PATTERN = re.compile(r'\|]=\[|[^\w\s\.,!?;:()[\]{}"\'-]')
+WHITESPACE_PATTERN = re.compile(r'\s+')
+
+# Bandit pattern detection
+AGE_PATTERN = re.compile(r'Age:\s*(\d+)')
+IMAGE_PLACEHOLDER_PATTERN = re.compile(r'\[IMAGE:\s*([^]]+)\]')
+IMAGE_REFERENCE_PATTERN = re.compile(r'\[IMAGE: (.*)\]', re.DOTALL)  # A whole AI output value that is "[IMAGE: id]"
+
+
+def clean_text(text: str) -> str:
+    """Clean text by removing non-readable characters and normalizing whitespace"""
+    text = UNREADABLE_CHARS_PATTERN.sub('', text)
+    text = DISALLOWED_CHARS_PATTERN.sub('', text)
+    return WHITESPACE_PATTERN.sub(' ', text).strip()
+
+
+TEXT_ONLY_FLAGS = fitz.TEXTFLAGS_DICT & ~fitz.TEXT_PRESERVE_IMAGES  # Text layout without decoding image blocks
+
+
+def page_image_blocks(doc: fitz.Document, page: fitz.Page, written: Dict[int, str]) -> List[Dict[str, Any]]:
+    """Image blocks for a page, read by xref instead of through the text layout: {"bbox", "image", "ext", "xref"},
+    or just {"bbox", "path"} for an xref already written to a file (written maps xref -> path), which isn't extracted again."""
+    infos = page.get_image_info(xrefs=True)
+    if any(info["xref"] == 0 for info in infos):
+        # Inline images have no xref to extract; take them from the full layout as before
+        return [b for b in page.get_text("dict")["blocks"] if "image" in b]
+    
+    blocks = []
+    for info in infos:
+        xref = info["xref"]
+        if xref in written:
+            blocks.append({"bbox": info["bbox"], "path": written[xref]})
+        else:
+            image = doc.extract_image(xref)
+            blocks.append({"bbox": info["bbox"], "image": image["image"], "ext": image["ext"], "xref": xref})
+    return blocks
+
+
+def advise_sequential_read(path: str):
+    """Hint the kernel to read ahead through the whole file (no-op where posix_fadvise is unavailable)"""
+    if not hasattr(os, "posix_fadvise"):
+        return
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)  # Start pulling the file into the page cache now
+    finally:
+        os.close(fd)
+
+
+def extract_pages(pdf_path: str, page_nums: List[int], image_dir: str) -> List[Tuple[int, List[Tuple[str, str]]]]:
+    """Process-pool entry point: extract pages in reading order as ("text", cleaned span) / ("image", file path) items.
+    Raw image data is written to image_dir rather than returned, so it never has to be held in memory."""
+    pages = []
+    written = {}  # xref -> file it was written to; only paths are kept, so image bytes never accumulate in memory
+    with fitz.open(pdf_path) as doc:
+        for page_num in page_nums:
+            page = doc[page_num - 1]  # fitz uses 0-based indexing
+            blocks = page.get_text("dict", flags=TEXT_ONLY_FLAGS)["blocks"] + page_image_blocks(doc, page, written)
+            sorted_blocks = sorted(blocks, key=lambda b: (b.get("bbox", [0, 0, 0, 0])[1], b.get("bbox", [0, 0, 0, 0])[0]))
+            
+            items = []
+            image_count = 0
+            for block in sorted_blocks:
+                if "lines" in block:  # Text block
+                    for line in block["lines"]:
+                        for span in line["spans"]:
+                            if span["text"].strip():
+                                cleaned_text = clean_text(span["text"].strip())
+                                if cleaned_text:
+                                    items.append(("text", cleaned_text))
+                
+                elif "path" in block:  # Image repeated from an earlier page - reuse its file
+                    image_count += 1
+                    items.append(("image", block["path"]))
+                
+                elif "image" in block:  # Image block
+                    image_count += 1
+                    image_path = Path(image_dir) / f"page_{page_num:03d}_{image_count:03d}.{block.get('ext', 'bin')}"
+                    image_path.write_bytes(block["image"])  # Raw image data
+                    if "xref" in block:
+                        written[block["xref"]] = str(image_path)
+                    items.append(("image", str(image_path)))
+            pages.append((page_num, items))
+    return pages
+
+
+@dataclass(frozen=True, slots=True)
+class Bandit:
+    """A bandit detected in the PDF text: name, age and the placeholder id of their photo"""
+    name: str
+    age: str
+    image_id: str
+    
+    @property
+    def key(self) -> str:
+        """name_age_imageid string, as used in AI cache keys"""
+        return f"{self.name}_{self.age}_{self.image_id}"
+
+
+class ImageFileMap(Mapping):
+    """Read-only placeholder_id -> image bytes mapping over extracted image files; each image is read on access"""
+    
+    def __init__(self, paths: Dict[str, Path]):
+        self.paths = paths
+    
+    def __getitem__(self, placeholder_id: str) -> bytes:
+        return self.paths[placeholder_id].read_bytes()
+    
+    def __iter__(self):
+        return iter(self.paths)
+    
+    def __len__(self) -> int:
+        return len(self.paths)
+
+
+class GeocodingCache(MutableMapping):
+    """cache key -> geocoding entry mapping stored in SQLite; every assignment is written to disk immediately"""
+    
+    def __init__(self, path: str = GEOCODING_CACHE_DB):
+        self.db = sqlite3.connect(path, timeout=30, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS geocoding (key TEXT PRIMARY KEY, address TEXT, lat REAL, lng REAL, ts REAL)"
+        )
+    
+    def __getitem__(self, key: str) -> Dict[str, Any]:
+        row = self.db.execute("SELECT address, lat, lng, ts FROM geocoding WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            raise KeyError(key)
+        return {'address': row[0], 'latitude': row[1], 'longitude': row[2], 'timestamp': row[3]}
+    
+    def __setitem__(self, key: str, entry: Dict[str, Any]):
+        self.db.execute("INSERT OR REPLACE INTO geocoding VALUES (?, ?, ?, ?, ?)", self.row(key, entry))
+    
+    def __delitem__(self, key: str):
+        if self.db.execute("DELETE FROM geocoding WHERE key = ?", (key,)).rowcount == 0:
+            raise KeyError(key)
+    
+    def __iter__(self):
+        return (key for (key,) in self.db.execute("SELECT key FROM geocoding").fetchall())
+    
+    def __len__(self) -> int:
+        return self.db.execute("SELECT COUNT(*) FROM geocoding").fetchone()[0]
+    
+    def __contains__(self, key) -> bool:
+        return self.db.execute("SELECT 1 FROM geocoding WHERE key = ?", (key,)).fetchone() is not None
+    
+    def row(self, key: str, entry: Dict[str, Any]) -> Tuple:
+        return (key, entry.get('address'), entry.get('latitude'), entry.get('longitude'), entry.get('timestamp'))
+    
+    def import_entries(self, entries: Dict[str, Dict[str, Any]]):
+        """Insert many entries in a single transaction"""
+        with self.db:
+            self.db.execute("BEGIN")
+            self.db.executemany("INSERT OR REPLACE INTO geocoding VALUES (?, ?, ?, ?, ?)",
+                                [self.row(key, entry) for key, entry in entries.items()])
+    
+    def successful_count(self) -> int:
+        return self.db.execute("SELECT COUNT(*) FROM geocoding WHERE lat IS NOT NULL").fetchone()[0]
+
+
 class DocumentProcessor:
     def __init__(self, docx_path: str):
         self.docx_path = Path(docx_path)
@@ -79,6 +665,7 @@ class DocumentProcessor:
         self.pdf_path = Path("banditsORIG.docx.pdf")
         self.output_dir = Path("pdf_output")
         self.output_dir.mkdir(exist_ok=True)
+        self.geocoding_cache: Optional[GeocodingCache] = None  # Opened on first use, then shared
         
     def convert_docx_to_pdf(self) -> Path:
         """Use existing banditsORIG.docx.pdf"""
@@ -99,170 +686,146 @@ class DocumentProcessor:
             return
         
         try:
-            # List all files in the bucket recursively
-            all_files = []
-            
-            # Get root level files
-            root_files = supabase.storage.from_(BUCKET_NAME).list()
-            for file_info in root_files:
-                if 'name' in file_info:
-                    all_files.append(file_info['name'])
-            
-            # Get files from pdf_images folder
-            try:
-                pdf_files = supabase.storage.from_(BUCKET_NAME).list(path="pdf_images/")
-                for file_info in pdf_files:
-                    if 'name' in file_info:
-                        all_files.append(f"pdf_images/{file_info['name']}")
-            except:
-                pass  # Folder might not exist
-            
-            # Get files from vision_images folder
-            try:
-                vision_files = supabase.storage.from_(BUCKET_NAME).list(path="vision_images/")
-                for file_info in vision_files:
-                    if 'name' in file_info:
-                        all_files.append(f"vision_images/{file_info['name']}")
-            except:
-                pass  # Folder might not exist
+            # List the bucket root and the image folders concurrently
+            all_files = sorted(self.list_bucket_files(["", *IMAGE_FOLDERS]))
             
             if all_files:
                 print(f"   Found {len(all_files)} files to delete")
                 
-                # Delete all files at once
-                try:
-                    supabase.storage.from_(BUCKET_NAME).remove(all_files)
-                    print(f"   🗑️  Deleted {len(all_files)} files from bucket")
-                except Exception as e:
-                    print(f"   ❌ Error deleting files: {e}")
-                    # Try deleting individually as fallback
-                    for file_path in all_files:
-                        try:
-                            supabase.storage.from_(BUCKET_NAME).remove([file_path])
-                            print(f"   🗑️  Deleted {file_path}")
-                        except Exception as e2:
-                            print(f"   ❌ Error deleting {file_path}: {e2}")
+                # Delete in batches of REMOVE_BATCH_SIZE paths per request
+                deleted_count = 0
+                for start in range(0, len(all_files), REMOVE_BATCH_SIZE):
+                    deleted_count += self.remove_bucket_files(all_files[start:start + REMOVE_BATCH_SIZE])
+                print(f"   🗑️  Deleted {deleted_count} files from bucket")
             else:
                 print("   ✅ Bucket already empty")
                 
         except Exception as e:
             print(f"   ❌ Error emptying bucket: {e}")
 
+    def remove_bucket_files(self, paths: List[str]) -> int:
+        """Remove paths with one request; if it fails, split the batch in half and retry each half
+        to isolate the failing file. Returns the number of files deleted."""
+        try:
+            supabase.storage.from_(BUCKET_NAME).remove(paths)
+            return len(paths)
+        except Exception as e:
+            if len(paths) == 1:
+                print(f"   ❌ Error deleting {paths[0]}: {e}")
+                return 0
+        
+        middle = len(paths) // 2
+        return self.remove_bucket_files(paths[:middle]) + self.remove_bucket_files(paths[middle:])
+
+    def list_bucket_files(self, folders: List[str]) -> set:
+        """List several bucket folders concurrently and return the full paths of all files found"""
+        def list_folder(folder: str) -> List[str]:
+            try:
+                files = supabase.storage.from_(BUCKET_NAME).list(path=folder) or []
+                return [f"{folder}{file_info['name']}" for file_info in files if 'name' in file_info]
+            except Exception as e:
+                print(f"   ⚠️  Could not list {folder or 'bucket root'}: {e}")
+                return []
+
+        with ThreadPoolExecutor(max_workers=len(folders) or 1) as executor:
+            return {path for paths in executor.map(list_folder, folders) for path in paths}
+
     def find_bandit_patterns_in_lines(self, lines: List[str], start_index: int = 0, max_bandits: int = None) -> List[Dict[str, Any]]:
-        """Helper method to find bandit patterns by finding Age: and looking backwards for name and image"""
-        import re
+        """Helper method to find bandit patterns: each Age: line paired with the nearest name and image above it"""
         found_patterns = []
+        # Single forward pass, remembering the most recent name candidate and image placeholder;
+        # both must be within the 9 lines above the Age: line
+        last_name = None
+        last_image = None
 
         for i, line in enumerate(lines[start_index:], start_index):
             if 'Age:' in line:
-                age_pattern = re.search(r'Age:\s*(\d+)', line)
-                if age_pattern:
-                    age_value = age_pattern.group(1)
-
-                    # Look backwards to find the first name and image
-                    found_name = None
-                    found_image = None
-
-                    # Search backwards from the age line
-                    for j in range(i-1, max(i-10, start_index-1), -1):
-                        line_stripped = lines[j].strip()
-
-                        # Look for potential name first (if we haven't found one yet)
-                        if (found_name is None and line_stripped and '[IMAGE:' not in line_stripped):
-                            # Check if this is a single word starting with capital letter
-                            words = line_stripped.split()
-                            if (len(words) == 1 and  # Single word only
-                                words[0][0].isupper() and  # Starts with capital letter
-                                words[0].isalpha() and  # All alphabetic characters
-                                len(words[0]) > 1):  # At least 2 characters
-
-                                found_name = {
-                                    'line_index': j,
-                                    'name': line_stripped
-                                }
-
-                        # Look for IMAGE placeholder
-                        if '[IMAGE:' in line_stripped and found_image is None:
-                            image_match = re.search(r'\[IMAGE:\s*([^]]+)\]', line_stripped)
-                            if image_match:
-                                found_image = {
-                                    'line_index': j,
-                                    'image_id': image_match.group(1),
-                                    'image_line': line_stripped
-                                }
-
-                        # Stop if we found both
-                        if found_name and found_image:
-                            break
-
-                    # If we found both name and image, create a pattern
-                    if found_name and found_image:
-                        pattern = {
-                            'line_index': found_image['line_index'],
-                            'image_id': found_image['image_id'],
-                            'name': found_name['name'],
-                            'age': age_value,
-                            'name_line_index': found_name['line_index'],
-                            'image_line': found_image['image_line']
-                        }
-                        found_patterns.append(pattern)
-
-                        # Stop if we've reached the maximum
-                        if max_bandits and len(found_patterns) >= max_bandits:
-                            break
+                age_pattern = AGE_PATTERN.search(line)
+                if (age_pattern and last_name and last_image
+                        and i - last_name['line_index'] <= 9 and i - last_image['line_index'] <= 9):
+                    pattern = {
+                        'line_index': last_image['line_index'],
+                        'image_id': last_image['image_id'],
+                        'name': last_name['name'],
+                        'age': age_pattern.group(1),
+                        'name_line_index': last_name['line_index'],
+                        'image_line': last_image['image_line']
+                    }
+                    found_patterns.append(pattern)
+
+                    # Stop if we've reached the maximum
+                    if max_bandits and len(found_patterns) >= max_bandits:
+                        break
 
-        return found_patterns
+            line_stripped = line.strip()
+            if '[IMAGE:' in line_stripped:
+                image_match = IMAGE_PLACEHOLDER_PATTERN.search(line_stripped)
+                if image_match:
+                    last_image = {
+                        'line_index': i,
+                        'image_id': image_match.group(1),
+                        'image_line': line_stripped
+                    }
+            elif line_stripped:
+                # A potential name is a single word starting with a capital letter, all alphabetic, at least 2 characters
+                # (an all-alphabetic line has no whitespace, so it is already a single word - no split needed)
+                if len(line_stripped) > 1 and line_stripped.isalpha() and line_stripped[0].isupper():
+                    last_name = {
+                        'line_index': i,
+                        'name': line_stripped
+                    }
 
-    def clean_text(self, text: str) -> str:
-        """Clean text by removing non-readable characters and normalizing whitespace"""
-        # Remove common non-readable characters
-        text = re.sub(r'[^\x00-\x7F\u00A0-\uFFFF]', '', text)
-        text = re.sub(r'[\u200B-\u200D\uFEFF]', '', text)
-        text = re.sub(r'●​', '', text)
-        text = re.sub(r'\|]=\[', '', text)
-        text = re.sub(r'[^\w\s\.,!?;:()[\]{}"\'-]', '', text)
-        
-        # Normalize whitespace
-        text = re.sub(r'\s+', ' ', text)
-        text = text.strip()
-        
-        return text
+        return found_patterns
 
     def extract_text_with_placeholders(self) -> Dict[str, Any]:
         """Extract PDF text and replace images with placeholders (limited to first MAX_BANDITS bandits)"""
         print(f"🔍 Extracting text from PDF: {self.pdf_path} (first {MAX_BANDITS} bandits only)")
         
-        doc = fitz.open(str(self.pdf_path))
-        readable_text = ""
+        readable_parts: List[str] = []
         image_map = {}
         image_counter = 0
         max_bandits = MAX_BANDITS
-        found_bandits = []  # Track found bandits to avoid duplicates
+        found_bandits: List[Bandit] = []
+        seen_bandits = set()  # Track found bandits to avoid duplicates
         
-        # Process all pages to extract text and images
-        for page_num in range(1, len(doc) + 1):
-            page = doc[page_num - 1]  # fitz uses 0-based indexing
-            print(f"📖 Processing page {page_num}...")
-            
-            blocks = page.get_text("dict")["blocks"]
-            sorted_blocks = sorted(blocks, key=lambda b: (b.get("bbox", [0, 0, 0, 0])[1], b.get("bbox", [0, 0, 0, 0])[0]))
+        source_key = self.extraction_cache_key()
+        extracted_pages = self.load_extraction_cache(source_key)
+        if extracted_pages is not None:
+            print(f"📂 Reusing {len(extracted_pages)} extracted pages from {EXTRACTION_CACHE_FILE} (PDF unchanged)")
+        else:
+            advise_sequential_read(str(self.pdf_path))
+            with fitz.open(str(self.pdf_path)) as doc:
+                page_count = len(doc)
             
-            for block in sorted_blocks:
-                if "lines" in block:  # Text block
-                    for line in block["lines"]:
-                        for span in line["spans"]:
-                            if span["text"].strip():
-                                cleaned_text = self.clean_text(span["text"].strip())
-                                if cleaned_text:
-                                    readable_text += cleaned_text + "\n"
-                
-                elif "image" in block:  # Image block
+            # Extract contiguous page ranges in parallel worker processes (each opens the PDF itself)
+            image_dir = self.output_dir / "images"
+            image_dir.mkdir(exist_ok=True)
+            page_nums = list(range(1, page_count + 1))
+            workers = min(PAGE_WORKERS, page_count) or 1
+            range_size = -(-page_count // workers)
+            page_ranges = [page_nums[start:start + range_size] for start in range(0, page_count, range_size)]
+            if len(page_ranges) <= 1:
+                results = [extract_pages(str(self.pdf_path), page_range, str(image_dir)) for page_range in page_ranges]
+            else:
+                with ProcessPoolExecutor(max_workers=workers) as executor:
+                    results = list(executor.map(extract_pages, [str(self.pdf_path)] * len(page_ranges), page_ranges,
+                                                [str(image_dir)] * len(page_ranges)))
+            extracted_pages = [page for pages in results for page in pages]
+            self.save_extraction_cache(source_key, extracted_pages)
+        
+        # Stitch pages back in order; placeholder ids number images across the whole document
+        for page_num, items in extracted_pages:
+            print(f"📖 Processing page {page_num}...")
+            for kind, value in items:
+                if kind == "text":
+                    readable_parts.append(value)
+                else:
                     image_counter += 1
                     placeholder_id = f"img_{page_num:03d}_{image_counter:03d}"
-                    readable_text += f"[IMAGE: {placeholder_id}]\n"
-                    image_map[placeholder_id] = block["image"]  # Store raw image data
+                    readable_parts.append(f"[IMAGE: {placeholder_id}]")
+                    image_map[placeholder_id] = Path(value)
         
-        doc.close()
+        readable_text = "\n".join(readable_parts) + "\n" if readable_parts else ""
         
         # Now analyze the complete text to find bandits with debugging
         # Pattern: [IMAGE: xxx] followed by name, followed by "Age:"
@@ -278,12 +841,12 @@ class DocumentProcessor:
             print(f"   🤔 Potential name at line {pattern['name_line_index']}: '{pattern['name']}'")
             print(f"   ✅ Found Age: {pattern['age']}")
 
-            # Create a unique identifier: name_age_imageid
-            bandit_key = f"{pattern['name']}_{pattern['age']}_{pattern['image_id']}"
+            bandit = Bandit(pattern['name'], pattern['age'], pattern['image_id'])
 
             # Check for duplicates (same name+age+image combination)
-            if bandit_key not in found_bandits:
-                found_bandits.append(bandit_key)
+            if bandit not in seen_bandits:
+                seen_bandits.add(bandit)
+                found_bandits.append(bandit)
                 print(f"🎯 CONFIRMED BANDIT #{len(found_bandits)}: {pattern['name']}, Age: {pattern['age']}, Image: {pattern['image_id']}")
             else:
                 print(f"   ⚠️  Duplicate bandit ignored: {pattern['name']} (same name+age+image)")
@@ -294,132 +857,84 @@ class DocumentProcessor:
         print(f"\n📊 BANDIT DETECTION SUMMARY:")
         print(f"   Total bandits found: {len(found_bandits)}")
         print(f"   Bandits list:")
-        for i, bandit_key in enumerate(found_bandits, 1):
-            parts = bandit_key.split('_')
-            if len(parts) >= 3:
-                # New format: name_age_imageid
-                name = parts[0]
-                age = parts[1] if parts[1] and parts[1] != 'None' else "Unknown"
-                image_id = '_'.join(parts[2:])  # Join remaining parts for image ID
-                print(f"   {i:2d}. {name} (Age: {age}) [Image: {image_id}]")
-            else:
-                # Fallback for old format
-                name = parts[0] if len(parts) > 0 else "Unknown"
-                age = parts[1] if len(parts) > 1 else "Unknown"
-                print(f"   {i:2d}. {name} (Age: {age})")
+        for i, bandit in enumerate(found_bandits, 1):
+            print(f"   {i:2d}. {bandit.name} (Age: {bandit.age or 'Unknown'}) [Image: {bandit.image_id}]")
         
         return {
             "readable_text": readable_text,
-            "image_data": image_map,
+            "image_data": ImageFileMap(image_map),
             "total_images": len(image_map),
             "detected_bandits_count": len(found_bandits),
-            "detected_bandits_list": found_bandits
+            "detected_bandits_list": found_bandits,
+            "lines": lines,  # readable_text split into lines, shared by later stages instead of re-splitting
+            "bandit_patterns": patterns
         }
 
-    def detect_and_crop_face(self, image_data: bytes) -> Tuple[bytes, bool]:
-        """Improved face detection and cropping algorithm"""
+    def extraction_cache_key(self) -> str:
+        """Identify the current PDF contents (path, modification time, size) and the extraction code version"""
+        stat = self.pdf_path.stat()
+        return f"v{EXTRACTION_FORMAT_VERSION}:{self.pdf_path.resolve()}:{stat.st_mtime_ns}:{stat.st_size}"
+    
+    def load_extraction_cache(self, source_key: str) -> Optional[List[Tuple[int, List[Tuple[str, str]]]]]:
+        """Load the cached extract_pages results if they were made from this PDF and all their image files still exist"""
+        cache_path = self.output_dir / EXTRACTION_CACHE_FILE
+        if not (USE_EXTRACTION_CACHE and cache_path.exists()):
+            return None
         try:
-            nparr = np.frombuffer(image_data, np.uint8)
-            img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-            
-            if img is None:
-                return image_data, False
-            
-            img_height, img_width = img.shape[:2]
-            gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-            face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
-            
-            # Use improved face detection parameters
-            faces = face_cascade.detectMultiScale(
-                gray, 
-                scaleFactor=1.02,  # More sensitive
-                minNeighbors=2,    # More sensitive  
-                minSize=(15, 15)   # Smaller minimum size
-            )
-            
-            if len(faces) == 0:
-                return image_data, False
-            
-            # Get largest face
-            largest_face = max(faces, key=lambda x: x[2] * x[3])
-            x, y, w, h = largest_face
-            
-            # Validate face size
-            face_area_percentage = (w * h) / (img_width * img_height) * 100
-            if face_area_percentage < 0.5 or face_area_percentage > 60:
-                return image_data, False
-            
-            # Calculate face center
-            face_center_x = x + w // 2
-            face_center_y = y + h // 2
-            
-            # Create square crop centered on face
-            face_size = max(w, h)
-            padding_factor = 2.0
-            crop_size = int(face_size * padding_factor)
-            crop_size = min(crop_size, min(img_width, img_height))
-            
-            half_crop = crop_size // 2
-            crop_left = max(0, face_center_x - half_crop)
-            crop_right = min(img_width, face_center_x + half_crop)
-            crop_top = max(0, face_center_y - half_crop)
-            crop_bottom = min(img_height, face_center_y + half_crop)
-            
-            # Adjust boundaries if needed
-            if crop_right - crop_left < crop_size:
-                if crop_left == 0:
-                    crop_right = min(img_width, crop_size)
-                else:
-                    crop_left = max(0, img_width - crop_size)
-            
-            if crop_bottom - crop_top < crop_size:
-                if crop_top == 0:
-                    crop_bottom = min(img_height, crop_size)
-                else:
-                    crop_top = max(0, img_height - crop_size)
-            
-            if crop_left >= crop_right or crop_top >= crop_bottom:
-                return image_data, False
-            
-            # Perform crop
-            cropped_img = img[crop_top:crop_bottom, crop_left:crop_right]
-            success, encoded_img = cv2.imencode('.jpg', cropped_img, [cv2.IMWRITE_JPEG_QUALITY, 90])
-            
-            if success:
-                return encoded_img.tobytes(), True
-            else:
-                return image_data, False
-                
+            with open(cache_path, 'r', encoding='utf-8') as f:
+                cache = json.load(f)
         except Exception as e:
-            print(f"⚠️  Error in improved face detection: {str(e)}")
-            return image_data, False
+            print(f"⚠️  Error loading extraction cache: {str(e)}")
+            return None
+        
+        if cache.get('source') != source_key:
+            print(f"📄 PDF or extraction code changed since {EXTRACTION_CACHE_FILE} was written, extracting again")
+            return None
+        pages = cache['pages']
+        if not all(Path(value).exists() for _, items in pages for kind, value in items if kind == "image"):
+            print(f"⚠️  Extracted images missing from {self.output_dir}, extracting again")
+            return None
+        return pages
+    
+    def save_extraction_cache(self, source_key: str, pages: List[Tuple[int, List[Tuple[str, str]]]]):
+        """Save extract_pages results for reuse while the PDF is unchanged"""
+        if not USE_EXTRACTION_CACHE:
+            return
+        try:
+            with open(self.output_dir / EXTRACTION_CACHE_FILE, 'w', encoding='utf-8') as f:
+                json.dump({'source': source_key, 'pages': pages}, f, ensure_ascii=False)
+        except Exception as e:
+            print(f"❌ Error saving extraction cache: {str(e)}")
 
-    def load_geocoding_cache(self) -> Dict[str, Dict[str, Any]]:
-        """Load geocoding cache from file"""
+    def load_geocoding_cache(self) -> GeocodingCache:
+        """Open the SQLite geocoding cache, seeding it from the legacy JSON cache file when it is empty"""
+        if self.geocoding_cache is not None:
+            return self.geocoding_cache
+        cache = self.geocoding_cache = GeocodingCache()
         cache_path = Path(GEOCODING_CACHE_FILE)
-        if cache_path.exists():
+        if len(cache) == 0 and cache_path.exists():
             try:
                 with open(cache_path, 'r', encoding='utf-8') as f:
-                    cache = json.load(f)
-                print(f"📂 Loaded geocoding cache with {len(cache)} entries")
-                return cache
+                    cache.import_entries(json.load(f))
+                print(f"📦 Imported {len(cache)} entries from {GEOCODING_CACHE_FILE}")
             except Exception as e:
-                print(f"⚠️  Error loading geocoding cache: {str(e)}")
-                return {}
+                print(f"⚠️  Error importing geocoding cache: {str(e)}")
+        
+        if len(cache):
+            print(f"📂 Loaded geocoding cache with {len(cache)} entries")
         else:
             print(f"📂 No existing geocoding cache found, will create new one")
-            return {}
+        return cache
+    
+    def geocoding_cache_entry(self, full_address: str, lat: float, lng: float) -> Dict[str, Any]:
+        """Build the cache entry stored for a successfully geocoded address"""
+        return {
+            'address': full_address,
+            'latitude': lat,
+            'longitude': lng,
+            'timestamp': time.time()
+        }
     
-    def save_geocoding_cache(self, cache: Dict[str, Dict[str, Any]]):
-        """Save geocoding cache to file"""
-        try:
-            cache_path = Path(GEOCODING_CACHE_FILE)
-            with open(cache_path, 'w', encoding='utf-8') as f:
-                json.dump(cache, f, indent=2, ensure_ascii=False)
-            print(f"💾 Saved geocoding cache with {len(cache)} entries")
-        except Exception as e:
-            print(f"❌ Error saving geocoding cache: {str(e)}")
-
     def load_ai_cache(self) -> Dict[str, Any]:
         """Load AI processing cache from file"""
         cache_path = Path(AI_CACHE_FILE)
@@ -446,142 +961,52 @@ class DocumentProcessor:
         except Exception as e:
             print(f"❌ Error saving AI cache: {str(e)}")
 
-    def create_cache_key(self, text: str, detected_bandits: List[str], max_bandits: int) -> str:
+    def create_cache_key(self, text: str, detected_bandits: List[Bandit], max_bandits: int) -> str:
         """Create a unique cache key for AI processing"""
-        import hashlib
         # Create a deterministic hash from the input parameters
-        content = f"{text}|{sorted(detected_bandits[:max_bandits])}|{max_bandits}"
+        content = f"{text}|{sorted(bandit.key for bandit in detected_bandits[:max_bandits])}|{max_bandits}"
         return hashlib.md5(content.encode('utf-8')).hexdigest()
     
-    def geocode_with_nominatim(self, full_address: str) -> Tuple[Optional[float], Optional[float]]:
-        """Use free Nominatim (OpenStreetMap) geocoding service"""
-        try:
-            # Nominatim API (free, no API key required)
-            url = "https://nominatim.openstreetmap.org/search"
-            params = {
-                'q': full_address,
-                'format': 'json',
-                'limit': 1,
-                'addressdetails': 1
-            }
-            
-            headers = {
-                'User-Agent': 'BanditsApp/1.0 (geocoding for Athens events)'
-            }
-            
-            response = requests.get(url, params=params, headers=headers, timeout=10)
-            response.raise_for_status()
-            
-            data = response.json()
-            
-            if data and len(data) > 0:
-                result = data[0]
-                lat = float(result['lat'])
-                lng = float(result['lon'])
-                return lat, lng
-            else:
-                return None, None
-                
-        except Exception as e:
-            print(f"   ❌ Nominatim geocoding error: {str(e)}")
-            return None, None
+    def nominatim_params(self, full_address: str) -> Dict[str, Any]:
+        """Query parameters for a Nominatim search"""
+        return {
+            'q': full_address,
+            'format': 'json',
+            'limit': 1,
+            'addressdetails': 1
+        }
     
-    def geocode_with_google(self, full_address: str) -> Tuple[Optional[float], Optional[float]]:
-        """Use Google Maps geocoding service (requires API key)"""
-        if not GOOGLE_MAPS_API_KEY:
-            return None, None
-            
-        try:
-            url = "https://maps.googleapis.com/maps/api/geocode/json"
-            params = {
-                'address': full_address,
-                'key': GOOGLE_MAPS_API_KEY
-            }
-            
-            response = requests.get(url, params=params, timeout=10)
-            response.raise_for_status()
-            
-            data = response.json()
-            
-            if data['status'] == 'OK' and len(data['results']) > 0:
-                location = data['results'][0]['geometry']['location']
-                lat = location['lat']
-                lng = location['lng']
-                return lat, lng
-            elif data['status'] == 'ZERO_RESULTS':
-                return None, None
-            elif data['status'] == 'OVER_QUERY_LIMIT':
-                print(f"   ❌ Google Maps API quota exceeded")
-                return None, None
-            else:
-                print(f"   ❌ Google geocoding failed: {data['status']}")
-                return None, None
-                
-        except Exception as e:
-            print(f"   ❌ Google geocoding error: {str(e)}")
+    def parse_nominatim_response(self, data: List[Dict[str, Any]]) -> Tuple[Optional[float], Optional[float]]:
+        """Extract coordinates from a Nominatim search response"""
+        if data and len(data) > 0:
+            result = data[0]
+            lat = float(result['lat'])
+            lng = float(result['lon'])
+            return lat, lng
+        else:
             return None, None
     
-    def geocode_address(self, address: str, city: str = "Athens, Greece", cache: Dict[str, Dict[str, Any]] = None) -> Tuple[Optional[float], Optional[float]]:
-        """Geocode an address to get latitude and longitude coordinates with caching"""
-        if not address or not address.strip():
-            return None, None
-        
-        # Clean and format the address
-        full_address = f"{address.strip()}, {city}"
-        cache_key = full_address.lower()
-        
-        # Check cache first
-        if cache and cache_key in cache:
-            cached_result = cache[cache_key]
-            lat = cached_result.get('latitude')
-            lng = cached_result.get('longitude')
-            if lat is not None and lng is not None:
-                print(f"📋 Using cached coordinates for: {full_address} -> {lat}, {lng}")
-                return lat, lng
-            else:
-                print(f"📋 Found cached negative result for: {full_address}")
-                return None, None
-        
-        print(f"🌍 Geocoding address: {full_address}")
-        
-        # Try geocoding services
-        lat, lng = None, None
-        
-        if USE_FREE_GEOCODING:
-            print(f"   🆓 Trying Nominatim (free)...")
-            lat, lng = self.geocode_with_nominatim(full_address)
-
-            # Always try Google as fallback if Nominatim fails and Google API is available
-            if (lat is None or lng is None) and GOOGLE_MAPS_API_KEY:
-                print(f"   🔄 Nominatim failed, trying Google Maps as fallback...")
-                lat, lng = self.geocode_with_google(full_address)
-        else:
-            # Use Google first, fallback to Nominatim
-            if GOOGLE_MAPS_API_KEY:
-                print(f"   🗺️  Trying Google Maps...")
-                lat, lng = self.geocode_with_google(full_address)
-
-            # If Google fails, try Nominatim as fallback
-            if (lat is None or lng is None):
-                print(f"   🔄 Google failed, trying Nominatim as fallback...")
-                lat, lng = self.geocode_with_nominatim(full_address)
-        
-        # Cache the result (only successful geocoding with valid coordinates) and save immediately
-        if cache is not None and lat is not None and lng is not None:
-            cache[cache_key] = {
-                'address': full_address,
-                'latitude': lat,
-                'longitude': lng,
-                'timestamp': time.time()
-            }
-            # Save cache immediately after each geocoding attempt
-            self.save_geocoding_cache(cache)
-        
-        if lat is not None and lng is not None:
-            print(f"   ✅ Geocoded to: {lat}, {lng}")
+    def google_params(self, full_address: str) -> Dict[str, Any]:
+        """Query parameters for a Google Maps geocoding request"""
+        return {
+            'address': full_address,
+            'key': GOOGLE_MAPS_API_KEY
+        }
+    
+    def parse_google_response(self, data: Dict[str, Any]) -> Tuple[Optional[float], Optional[float]]:
+        """Extract coordinates from a Google Maps geocoding response"""
+        if data['status'] == 'OK' and len(data['results']) > 0:
+            location = data['results'][0]['geometry']['location']
+            lat = location['lat']
+            lng = location['lng']
             return lat, lng
+        elif data['status'] == 'ZERO_RESULTS':
+            return None, None
+        elif data['status'] == 'OVER_QUERY_LIMIT':
+            print(f"   ❌ Google Maps API quota exceeded")
+            return None, None
         else:
-            print(f"   ❌ Geocoding failed for: {full_address}")
+            print(f"   ❌ Google geocoding failed: {data['status']}")
             return None, None
     
     def geocode_events_batch(self, events: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
@@ -595,41 +1020,44 @@ class DocumentProcessor:
         geocoded_count = 0
         cached_count = 0
         skipped_count = 0
-        api_calls = 0
         
         service_name = "Nominatim (free)" if USE_FREE_GEOCODING else "Google Maps"
         print(f"🔧 Using {service_name} as primary geocoding service")
         
+        # Look up every distinct uncached address once, concurrently (each service keeps its own rate limit)
+        pending = {}  # cache key -> full address
+        for event in events:
+            address = event.get('address', '').strip()
+            if address:
+                full_address = f"{address}, Athens, Greece"
+                if full_address.lower() not in cache:
+                    pending[full_address.lower()] = full_address
+        api_calls = len(pending)
+        
+        if pending:
+            # Successful results are written to the cache as they arrive
+            asyncio.run(self.geocode_addresses_async(list(pending.values()), cache))
+        
         for i, event in enumerate(events, 1):
             address = event.get('address', '').strip()
             
             if address:
                 print(f"📍 Event {i}/{len(events)}: {event.get('name', 'Unknown')}")
                 
-                # Check if we need rate limiting (only for API calls, not cached results)
-                full_address = f"{address.strip()}, Athens, Greece"
-                cache_key = full_address.lower()
-                needs_api_call = cache_key not in cache
-                
-                if needs_api_call and api_calls > 0:
-                    # Rate limiting: Nominatim allows 1 request per second, Google allows more
-                    delay = 1.1 if USE_FREE_GEOCODING else 0.2
-                    time.sleep(delay)
-                
-                lat, lng = self.geocode_address(address, city="Athens, Greece", cache=cache)
-                
-                if needs_api_call:
-                    api_calls += 1
+                cache_key = f"{address}, Athens, Greece".lower()
+                cached_result = cache.get(cache_key, {})
+                lat = cached_result.get('latitude')
+                lng = cached_result.get('longitude')
                 
                 # Create updated event with coordinates
                 updated_event = event.copy()
                 if lat is not None and lng is not None:
                     updated_event['latitude'] = lat
                     updated_event['longitude'] = lng
-                    if cache_key in cache and cache[cache_key].get('timestamp', 0) < time.time() - 1:
-                        cached_count += 1
-                    else:
+                    if cache_key in pending:
                         geocoded_count += 1
+                    else:
+                        cached_count += 1
                 else:
                     # Keep the event but without coordinates
                     updated_event['latitude'] = None
@@ -646,8 +1074,6 @@ class DocumentProcessor:
                 skipped_count += 1
                 print(f"📍 Event {i}/{len(events)}: {event.get('name', 'Unknown')} - No address")
         
-        # Cache is already saved after each geocoding attempt
-        
         print(f"\n📊 Geocoding Summary:")
         print(f"   ✅ Successfully geocoded (new): {geocoded_count} events")
         print(f"   📋 Used cached results: {cached_count} events")
@@ -656,7 +1082,60 @@ class DocumentProcessor:
         print(f"   💾 Cache now contains: {len(cache)} entries")
         
         return geocoded_events
-    def save_bandit_images_locally(self, image_data: Dict[str, bytes], bandit_patterns: List[Dict[str, Any]]) -> None:
+
+    async def geocode_addresses_async(self, full_addresses: List[str],
+                                      cache: GeocodingCache) -> Dict[str, Tuple[Optional[float], Optional[float]]]:
+        """Geocode many addresses concurrently over one HTTP/2 client, respecting each service's rate limit"""
+        limiters = {
+            "nominatim": AsyncRateLimiter(1.05),  # Nominatim allows 1 request per second
+            "google": AsyncRateLimiter(0.05)
+        }
+        semaphores = {
+            "nominatim": asyncio.Semaphore(2),
+            "google": asyncio.Semaphore(10)
+        }
+        
+        async with httpx.AsyncClient(http2=True, timeout=10, limits=httpx.Limits(max_connections=12)) as client:
+            results = await asyncio.gather(*(
+                self.geocode_address_async(client, full_address, limiters, semaphores, cache)
+                for full_address in full_addresses
+            ))
+        return dict(zip(full_addresses, results))
+
+    async def geocode_address_async(self, client: httpx.AsyncClient, full_address: str,
+                                    limiters: Dict[str, "AsyncRateLimiter"],
+                                    semaphores: Dict[str, asyncio.Semaphore],
+                                    cache: GeocodingCache) -> Tuple[Optional[float], Optional[float]]:
+        """Geocode one address with the primary service, falling back to the other one"""
+        services = ["nominatim", "google"] if USE_FREE_GEOCODING else ["google", "nominatim"]
+        
+        lat, lng = None, None
+        for service in services:
+            if service == "google" and not GOOGLE_MAPS_API_KEY:
+                continue
+            async with semaphores[service]:
+                await limiters[service].wait()
+                try:
+                    if service == "nominatim":
+                        response = await client.get(NOMINATIM_URL, params=self.nominatim_params(full_address),
+                                                    headers=NOMINATIM_HEADERS)
+                        response.raise_for_status()
+                        lat, lng = self.parse_nominatim_response(response.json())
+                    else:
+                        response = await client.get(GOOGLE_GEOCODE_URL, params=self.google_params(full_address))
+                        response.raise_for_status()
+                        lat, lng = self.parse_google_response(response.json())
+                except Exception as e:
+                    print(f"   ❌ {service.capitalize()} geocoding error for {full_address}: {str(e)}")
+            if lat is not None and lng is not None:
+                print(f"   ✅ Geocoded {full_address} to: {lat}, {lng}")
+                cache[full_address.lower()] = self.geocoding_cache_entry(full_address, lat, lng)
+                return lat, lng
+        
+        print(f"   ❌ Geocoding failed for: {full_address}")
+        return None, None
+
+    def save_bandit_images_locally(self, image_data: Mapping, bandit_patterns: List[Dict[str, Any]]) -> None:
         """Save bandit images locally with bandit_name+image_placeholder naming"""
         print(f"💾 Saving bandit images locally...")
 
@@ -673,9 +1152,14 @@ class DocumentProcessor:
 
         saved_count = 0
 
-        for placeholder_id, raw_image_data in image_data.items():
-            # Check if this image belongs to a bandit
-            if placeholder_id in image_to_bandit:
+        # Apply face detection and cropping to all bandit images in parallel
+        bandit_images = {pid: image_data[pid] for pid in image_data if pid in image_to_bandit}
+        processed_images = detect_and_crop_faces(bandit_images)
+
+        # Write the files from a thread pool; file writes release the GIL, so they overlap
+        with ThreadPoolExecutor(max_workers=WRITE_WORKERS) as executor:
+            futures = {}
+            for placeholder_id, (processed_data, face_detected) in processed_images.items():
                 bandit_name = image_to_bandit[placeholder_id]
 
                 # Clean bandit name for filename (remove special characters)
@@ -684,15 +1168,12 @@ class DocumentProcessor:
                 # Create filename: bandit_name+image_placeholder.jpg
                 filename = f"{clean_name}+{placeholder_id}.jpg"
                 file_path = bandit_images_dir / filename
+                futures[executor.submit(file_path.write_bytes, processed_data)] = (filename, face_detected)
 
+            for future in as_completed(futures):
+                filename, face_detected = futures[future]
                 try:
-                    # Apply face detection and cropping if possible
-                    processed_data, face_detected = self.detect_and_crop_face(raw_image_data)
-
-                    # Save the processed image
-                    with open(file_path, 'wb') as f:
-                        f.write(processed_data)
-
+                    future.result()
                     status = "Face cropped" if face_detected else "Saved"
                     print(f"   ✅ {status}: {filename}")
                     saved_count += 1
@@ -702,7 +1183,7 @@ class DocumentProcessor:
 
         print(f"📊 Saved {saved_count} bandit images to {bandit_images_dir}/")
 
-    def upload_images_to_supabase(self, image_data: Dict[str, bytes], bandit_patterns: List[Dict[str, Any]] = None) -> Dict[str, str]:
+    def upload_images_to_supabase(self, image_data: Mapping, bandit_patterns: List[Dict[str, Any]] = None) -> Dict[str, str]:
         """Upload images to Supabase storage, using pre-cropped bandit images when available"""
         print(f"📤 Processing {len(image_data)} images to Supabase...")
 
@@ -725,106 +1206,169 @@ class DocumentProcessor:
                     bandit_image_map[image_id] = cropped_file
                     print(f"🎯 Found pre-cropped bandit image: {cropped_file.name}")
 
-        # First, get list of existing files in the pdf_images folder
+        # First, get list of existing files in all image folders (one listing per folder, fetched concurrently)
         print("🔍 Checking for existing images in bucket...")
-        existing_files = set()
-        try:
-            existing_files_list = supabase.storage.from_(BUCKET_NAME).list(path="pdf_images/")
-            for file_info in existing_files_list:
-                if 'name' in file_info:
-                    existing_files.add(file_info['name'])
-            print(f"   Found {len(existing_files)} existing images")
-        except Exception as e:
-            print(f"   ⚠️  Could not list existing files: {e}")
+        existing_files = self.list_bucket_files(IMAGE_FOLDERS)
+        print(f"   Found {len(existing_files)} existing images")
 
         image_urls = {}
         uploaded_count = 0
         existing_count = 0
-
-        for placeholder_id, raw_image_data in image_data.items():
+        # Public URLs are plain string formatting, so build them here instead of through the storage client per file
+        public_url_base = f"{SUPABASE_URL}/storage/v1/object/public/{BUCKET_NAME}/"
+
+        pending_uploads = []  # (placeholder_id, file_path, local file) for pre-cropped images
+        to_crop = {}  # placeholder_id -> (file_path, raw image data) for images that still need face cropping
+        first_with_content = {}  # content hash -> first to_crop placeholder_id with those exact bytes
+        duplicate_of = {}  # placeholder_id -> placeholder_id of an identical image uploaded in its place
+        for placeholder_id in image_data:
             try:
                 file_name = f"{placeholder_id}.jpg"
                 file_path = f"pdf_images/{file_name}"
 
                 # Check if file already exists
-                if file_name in existing_files:
+                if file_path in existing_files:
                     # File exists, just get the public URL
-                    public_url = supabase.storage.from_(BUCKET_NAME).get_public_url(file_path)
+                    public_url = public_url_base + file_path
                     image_urls[placeholder_id] = public_url
                     existing_count += 1
                     print(f"✅ Using existing: {placeholder_id} -> {public_url}")
                 else:
                     # Check if we have a pre-cropped bandit image to use
                     if placeholder_id in bandit_image_map:
-                        # Use pre-cropped image from bandit_images folder
-                        cropped_file_path = bandit_image_map[placeholder_id]
-                        with open(cropped_file_path, 'rb') as f:
-                            processed_data = f.read()
-                        status_msg = "Pre-cropped bandit"
+                        # Use pre-cropped image from bandit_images folder (streamed from disk by the upload)
+                        pending_uploads.append((placeholder_id, file_path, bandit_image_map[placeholder_id]))
                     else:
-                        # File doesn't exist and no pre-cropped version, process normally
-                        processed_data, face_detected = self.detect_and_crop_face(raw_image_data)
-                        status_msg = "Face cropped" if face_detected else "Uploaded"
-
-                    if not DRY_RUN:
-                        try:
-                            # Upload and get the response
-                            upload_response = supabase.storage.from_(BUCKET_NAME).upload(
-                                path=file_path,
-                                file=processed_data,
-                                file_options={"content-type": "image/jpeg"}
-                            )
-
-                            # Get public URL from the upload response or construct it
-                            if hasattr(upload_response, 'data') and upload_response.data:
-                                public_url = upload_response.data.get('publicURL')
-                            else:
-                                # Fallback: get public URL using the API
-                                public_url = supabase.storage.from_(BUCKET_NAME).get_public_url(file_path)
-
-                            image_urls[placeholder_id] = public_url
-                            uploaded_count += 1
-                            print(f"✅ {status_msg}: {placeholder_id} -> {public_url}")
-
-                        except Exception as upload_error:
-                            # If upload fails due to duplicate, still get the public URL
-                            if "already exists" in str(upload_error) or "Duplicate" in str(upload_error):
-                                print(f"⚠️  File already exists, getting URL: {placeholder_id}")
-                                public_url = supabase.storage.from_(BUCKET_NAME).get_public_url(file_path)
-                                image_urls[placeholder_id] = public_url
-                                existing_count += 1
-                                print(f"✅ Using existing: {placeholder_id} -> {public_url}")
-                            else:
-                                raise upload_error
+                        # File doesn't exist and no pre-cropped version, crop it (only these images are read from disk)
+                        raw_image_data = image_data[placeholder_id]
+                        # A repeated photo is cropped and uploaded once; its copies reuse that URL
+                        content_hash = hashlib.blake2b(raw_image_data, digest_size=16).digest()
+                        if content_hash in first_with_content:
+                            duplicate_of[placeholder_id] = first_with_content[content_hash]
+                        else:
+                            first_with_content[content_hash] = placeholder_id
+                            to_crop[placeholder_id] = (file_path, raw_image_data)
 
             except Exception as e:
                 print(f"❌ Failed to process {placeholder_id}: {str(e)}")
 
-        print(f"📊 Upload summary: {uploaded_count} uploaded, {existing_count} existing")
+        if (pending_uploads or to_crop) and not DRY_RUN:
+            # Upload everything concurrently; each crop's upload starts as soon as its worker finishes it
+            print(f"📤 Uploading {len(pending_uploads) + len(to_crop)} images "
+                  f"({len(to_crop)} to crop, {UPLOAD_CONCURRENCY} uploads at a time)...")
+            upload_errors, faces_detected = asyncio.run(self.crop_and_upload_async(
+                [(file_path, local_file) for _, file_path, local_file in pending_uploads], to_crop
+            ))
+            upload_paths = {placeholder_id: file_path for placeholder_id, file_path, _ in pending_uploads}
+            upload_paths.update((placeholder_id, file_path) for placeholder_id, (file_path, _) in to_crop.items())
+            for placeholder_id in image_data:
+                if placeholder_id not in upload_paths:
+                    continue
+                file_path = upload_paths[placeholder_id]
+                if placeholder_id not in to_crop:
+                    status_msg = "Pre-cropped bandit"
+                else:
+                    status_msg = "Face cropped" if faces_detected.get(placeholder_id) else "Uploaded"
+                if upload_errors[file_path]:
+                    print(f"❌ Failed to process {placeholder_id}: {upload_errors[file_path]}")
+                    continue
+                public_url = public_url_base + file_path
+                image_urls[placeholder_id] = public_url
+                uploaded_count += 1
+                print(f"✅ {status_msg}: {placeholder_id} -> {public_url}")
+
+        duplicate_count = 0
+        for placeholder_id, original_id in duplicate_of.items():
+            if original_id in image_urls:
+                image_urls[placeholder_id] = image_urls[original_id]
+                duplicate_count += 1
+                print(f"♻️  Same image as {original_id}: {placeholder_id} -> {image_urls[placeholder_id]}")
+
+        print(f"📊 Upload summary: {uploaded_count} uploaded, {existing_count} existing, {duplicate_count} duplicates reused")
         return image_urls
 
-    def split_text_by_bandits(self, text: str, detected_bandits: List[str]) -> List[str]:
-        """Split text into chunks by bandit sections using the pre-detected bandits list"""
+    async def crop_and_upload_async(self, uploads: List[Tuple[str, Path]],
+                                    to_crop: Dict[str, Tuple[str, bytes]]) -> Tuple[Dict[str, Optional[str]], Dict[str, bool]]:
+        """Upload ready (path, local JPEG file) pairs, and face-crop the to_crop images in worker processes while uploads run.
+        Returns each path's upload error (None if uploaded) and whether a face was cropped for each to_crop image."""
+        if to_crop:
+            warn_if_face_detector_missing()
+        loop = asyncio.get_running_loop()
+        faces_detected = {}
+        
+        with ProcessPoolExecutor(max_workers=FACE_WORKERS) as executor:
+            async def crop(placeholder_id: str, raw_image_data: bytes) -> bytes:
+                _, processed_data, face_detected = await loop.run_in_executor(
+                    executor, detect_and_crop_face, (placeholder_id, raw_image_data)
+                )
+                faces_detected[placeholder_id] = face_detected
+                return processed_data
+            
+            files = uploads + [(file_path, crop(placeholder_id, raw_image_data))
+                               for placeholder_id, (file_path, raw_image_data) in to_crop.items()]
+            upload_errors = await self.upload_files_async(files)
+        return upload_errors, faces_detected
+
+    async def upload_files_async(self, files: List[Tuple[str, Any]]) -> Dict[str, Optional[str]]:
+        """Upload (path, data) pairs to the bucket concurrently over one HTTP/2 connection pool. data is JPEG bytes,
+        a local file Path (streamed in UPLOAD_CHUNK_SIZE pieces, never read whole), or an awaitable that produces
+        the bytes (the upload waits for it without holding an upload slot).
+        Returns each path's error message, or None if it was uploaded."""
+        semaphore = asyncio.Semaphore(UPLOAD_CONCURRENCY)
+        headers = {
+            "Authorization": f"Bearer {SUPABASE_KEY}",
+            "apikey": SUPABASE_KEY,
+            "Content-Type": "image/jpeg",
+            "x-upsert": "true"  # Overwrite a file created since the listing instead of failing
+        }
+
+        async def read_chunks(local_path: Path):
+            with open(local_path, 'rb') as f:
+                while chunk := f.read(UPLOAD_CHUNK_SIZE):
+                    yield chunk
+
+        async def upload_one(client: httpx.AsyncClient, file_path: str, data: Any) -> Optional[str]:
+            try:
+                if not isinstance(data, (bytes, Path)):
+                    data = await data
+            except Exception as e:
+                return str(e)
+            async with semaphore:
+                try:
+                    if isinstance(data, Path):
+                        # Declare the length up front so the stream isn't sent with chunked encoding
+                        content = read_chunks(data)
+                        request_headers = {**headers, "Content-Length": str(data.stat().st_size)}
+                    else:
+                        content, request_headers = data, headers
+                    response = await client.post(f"{SUPABASE_URL}/storage/v1/object/{BUCKET_NAME}/{file_path}",
+                                                 content=content, headers=request_headers)
+                    response.raise_for_status()
+                    return None
+                except Exception as e:
+                    return str(e)
+
+        limits = httpx.Limits(max_connections=UPLOAD_CONCURRENCY, max_keepalive_connections=UPLOAD_CONCURRENCY)
+        async with httpx.AsyncClient(http2=True, timeout=60, limits=limits) as client:
+            errors = await asyncio.gather(*(upload_one(client, file_path, data) for file_path, data in files))
+        return dict(zip((file_path for file_path, _ in files), errors))
+
+    def split_text_by_bandits(self, text: str, detected_bandits: List[Bandit],
+                              lines: Optional[List[str]] = None) -> List[str]:
+        """Split text into chunks by bandit sections using the pre-detected bandits list
+        (lines, if given, is text already split on newlines)"""
         print(f"✂️  Splitting text by bandit sections using {len(detected_bandits)} detected bandits...")
         
-        lines = text.split('\n')
+        if lines is None:
+            lines = text.split('\n')
         sections = []
         current_section = []
+        current_section_chars = 0  # Running length of the section's lines plus newlines (an upper bound on its text)
         
-        # Parse detected bandits: name_age_imageid format
-        bandit_info = []
-        for bandit in detected_bandits:
-            parts = bandit.split('_')
-            if len(parts) >= 3:
-                name = parts[0]
-                age = parts[1] if parts[1] and parts[1] != 'None' else None
-                image_id = '_'.join(parts[2:])  # Join remaining parts for image ID
-                bandit_info.append({'name': name, 'age': age, 'image_id': image_id, 'full_key': bandit})
-            else:
-                # Fallback for old format
-                name = parts[0] if len(parts) > 0 else "Unknown"
-                age = parts[1] if len(parts) > 1 else None
-                bandit_info.append({'name': name, 'age': age, 'image_id': None, 'full_key': bandit})
+        bandit_info = [
+            {'name': bandit.name, 'name_lower': bandit.name.lower(), 'age': bandit.age or None, 'image_id': bandit.image_id}
+            for bandit in detected_bandits
+        ]
         
         print(f"📝 Looking for these bandit combinations:")
         for info in bandit_info:
@@ -832,65 +1376,84 @@ class DocumentProcessor:
             image_str = f", Image: {info['image_id']}" if info['image_id'] else ""
             print(f"   - {info['name']}{age_str}{image_str}")
         
-        import re
-
         # Use helper method to find all patterns in the text
         all_patterns = self.find_bandit_patterns_in_lines(lines)
 
+        # Index patterns by (image line, image id) and bandits by image id, so each image line is a dict lookup
+        # instead of a scan over every pattern and every bandit
+        patterns_by_image_line = {}
+        for pattern in all_patterns:
+            patterns_by_image_line.setdefault((pattern['line_index'], pattern['image_id']), pattern)
+        bandits_by_image = defaultdict(list)  # image id (None = matches any image) -> indexes into bandit_info
+        bandits_by_key = {}  # (lowercased name, age, image id) -> bandit, for the common exact-match case
+        for index, info in enumerate(bandit_info):
+            bandits_by_image[info['image_id'] or None].append(index)
+            bandits_by_key.setdefault((info['name_lower'], info['age'], info['image_id']), info)
+
         for i, line in enumerate(lines):
             line_stripped = line.strip()
 
             # Look for IMAGE placeholders that start bandit sections
             if '[IMAGE:' in line_stripped:
                 # Extract image ID from this line
-                image_match = re.search(r'\[IMAGE:\s*([^]]+)\]', line_stripped)
+                image_match = IMAGE_PLACEHOLDER_PATTERN.search(line_stripped)
                 current_image_id = image_match.group(1) if image_match else None
                 print(f"🖼️  Found image at line {i}: {line_stripped} -> ID: {current_image_id}")
 
                 # Check if this image corresponds to any pattern found by our helper
                 detected_bandit = None
-                pattern_for_this_image = None
-
-                for pattern in all_patterns:
-                    if pattern['line_index'] == i and pattern['image_id'] == current_image_id:
-                        pattern_for_this_image = pattern
-                        break
+                pattern_for_this_image = patterns_by_image_line.get((i, current_image_id))
 
                 if pattern_for_this_image:
-                    # Now check if this pattern matches any detected bandit from our list
-                    for info in bandit_info:
-                        name_match = (info['name'].lower() == pattern_for_this_image['name'].lower() or
-                                    info['name'] in pattern_for_this_image['name'] or pattern_for_this_image['name'] in info['name'])
-                        age_match = (info['age'] == pattern_for_this_image['age'])
-                        image_match = (info['image_id'] == current_image_id) if info['image_id'] else True
-
-                        if name_match and age_match and image_match:
-                            detected_bandit = info
-                            print(f"   ✅ Found detected bandit: {info['name']}, Age: {info['age']}, Image: {info['image_id']}")
-                            break
+                    # Now check if this pattern matches any detected bandit from our list: exact name first,
+                    # then a partial name match among the bandits with this image
+                    pattern_name = pattern_for_this_image['name']
+                    pattern_name_lower = pattern_name.lower()
+                    detected_bandit = bandits_by_key.get((pattern_name_lower, pattern_for_this_image['age'], current_image_id))
+                    if detected_bandit is None:
+                        candidates = bandits_by_image.get(current_image_id, []) + bandits_by_image.get(None, [])
+                        for index in sorted(candidates):
+                            info = bandit_info[index]
+                            name_match = (info['name_lower'] == pattern_name_lower or
+                                        info['name'] in pattern_name or pattern_name in info['name'])
+                            age_match = (info['age'] == pattern_for_this_image['age'])
+
+                            if name_match and age_match:
+                                detected_bandit = info
+                                break
+                    if detected_bandit:
+                        print(f"   ✅ Found detected bandit: {detected_bandit['name']}, Age: {detected_bandit['age']}, Image: {detected_bandit['image_id']}")
                 
                 if detected_bandit:
                     # Save previous section if it has content
-                    if current_section and len('\n'.join(current_section).strip()) > 100:
-                        sections.append('\n'.join(current_section))
-                        print(f"   📄 Saved section #{len(sections)} ({len(current_section)} lines)")
+                    # (the section text is only joined once it could be long enough, and then reused)
+                    if current_section and current_section_chars > 100:
+                        section_text = '\n'.join(current_section)
+                        if len(section_text.strip()) > 100:
+                            sections.append(section_text)
+                            print(f"   📄 Saved section #{len(sections)} ({len(current_section)} lines)")
                     
                     # Start new section with the image
                     current_section = [line]
+                    current_section_chars = len(line) + 1
                     print(f"🎯 Starting new section for bandit: {detected_bandit['name']} (Age: {detected_bandit['age']})")
                 else:
                     # Not a detected bandit image, add to current section
                     current_section.append(line)
+                    current_section_chars += len(line) + 1
                     if current_image_id:
                         print(f"   ❌ Image {current_image_id} not associated with any detected bandit")
             else:
                 # Regular text line, add to current section
                 current_section.append(line)
+                current_section_chars += len(line) + 1
         
         # Add the last section
-        if current_section and len('\n'.join(current_section).strip()) > 100:
-            sections.append('\n'.join(current_section))
-            print(f"   📄 Saved final section #{len(sections)} ({len(current_section)} lines)")
+        if current_section and current_section_chars > 100:
+            section_text = '\n'.join(current_section)
+            if len(section_text.strip()) > 100:
+                sections.append(section_text)
+                print(f"   📄 Saved final section #{len(sections)} ({len(current_section)} lines)")
         
         print(f"📊 Split into {len(sections)} bandit-based sections")
         
@@ -909,36 +1472,88 @@ class DocumentProcessor:
             print(f"📄 Created {len(sections)} fixed chunks")
             return sections
 
-    def call_deepseek_api(self, prompt: str) -> str:
-        """Call DeepSeek API for text processing"""
-        url = "https://api.deepseek.com/chat/completions"
-        
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {DEEPSEEK_API_KEY}"
-        }
-        
+    async def call_deepseek_api_async(self, client: httpx.AsyncClient, semaphore: asyncio.Semaphore, prompt: str) -> str:
+        """Call DeepSeek API for text processing, retrying timeouts, 429 and 5xx with exponential backoff"""
         data = {
             "model": "deepseek-chat",
             "messages": [
                 {"role": "system", "content": "You are a data extraction expert. Extract ALL bandits and events from the provided text chunk. For timing info, only extract specific hours, days, or dates - ignore vague time descriptions. Return only valid JSON."},
                 {"role": "user", "content": prompt}
             ],
-            "temperature": 0.1,
-            "max_tokens": 4000
+            "temperature": 0.0,
+            "top_p": 1.0,
+            "max_tokens": 4096,
+            "response_format": {"type": "json_object"}
         }
         
+        # Deterministic requests (temperature 0) are served from the content-addressed cache when possible
+        request_hash = hashlib.sha256(json.dumps(data, sort_keys=True).encode('utf-8')).hexdigest()
+        cache_path = Path(DEEPSEEK_CACHE_DIR) / request_hash[:2] / f"{request_hash}.json"
+        if USE_AI_CACHE and cache_path.exists():
+            with open(cache_path, 'r', encoding='utf-8') as f:
+                return json.load(f)['content']
+        
+        async with semaphore:
+            for attempt in range(DEEPSEEK_MAX_RETRIES + 1):
+                try:
+                    response = await client.post("/chat/completions", json=data)
+                    response.raise_for_status()
+                    result = response.json()
+                    content = result['choices'][0]['message']['content']
+                    self.save_deepseek_response(cache_path, content)
+                    return content
+                except Exception as e:
+                    transient = isinstance(e, httpx.TransportError) or (
+                        isinstance(e, httpx.HTTPStatusError) and
+                        (e.response.status_code == 429 or e.response.status_code >= 500)
+                    )
+                    if not transient or attempt == DEEPSEEK_MAX_RETRIES:
+                        raise Exception(f"DeepSeek API error: {str(e)}")
+                    delay = 1.0 * 2 ** attempt
+                    print(f"   ⏳ DeepSeek request failed ({str(e)}), retrying in {delay:.0f}s...")
+                    await asyncio.sleep(delay)
+
+    def save_deepseek_response(self, cache_path: Path, content: str):
+        """Write a DeepSeek response to its cache file atomically (temp file + rename)"""
         try:
-            response = requests.post(url, headers=headers, json=data, timeout=60)
-            response.raise_for_status()
-            
-            result = response.json()
-            return result['choices'][0]['message']['content']
-            
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = cache_path.with_suffix(f".{os.getpid()}.tmp")
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'content': content}, f, ensure_ascii=False)
+            os.replace(tmp_path, cache_path)
         except Exception as e:
-            raise Exception(f"DeepSeek API error: {str(e)}")
-
-    def process_with_ai(self, text: str, detected_bandits: List[str], max_bandits: int = MAX_BANDITS) -> Dict[str, Any]:
+            print(f"⚠️  Error caching DeepSeek response: {str(e)}")
+
+    def call_claude_api(self, prompt: str) -> str:
+        """Call Claude for one text chunk and return the response text"""
+        response = ai_client.messages.create(
+            model="claude-3-5-sonnet-20241022",
+            max_tokens=4000,  # Smaller limit per chunk
+            temperature=0.1,
+            system="You are a data extraction expert. Extract ALL bandits and events from the provided text chunk. For timing info, only extract specific hours, days, or dates - ignore vague time descriptions. Return only valid JSON.",
+            messages=[
+                {"role": "user", "content": prompt}
+            ]
+        )
+        return response.content[0].text.strip()
+
+    def call_deepseek_batch(self, prompts: List[str]) -> List[Any]:
+        """Send all prompts to DeepSeek concurrently (at most DEEPSEEK_MAX_CONCURRENT in flight).
+        Returns each prompt's response text, or the exception it failed with."""
+        async def run() -> List[Any]:
+            semaphore = asyncio.Semaphore(DEEPSEEK_MAX_CONCURRENT)
+            headers = {"Authorization": f"Bearer {DEEPSEEK_API_KEY}"}
+            async with httpx.AsyncClient(base_url="https://api.deepseek.com", headers=headers,
+                                         timeout=httpx.Timeout(60.0), http2=True) as client:
+                return await asyncio.gather(
+                    *(self.call_deepseek_api_async(client, semaphore, prompt) for prompt in prompts),
+                    return_exceptions=True
+                )
+        
+        return asyncio.run(run())
+
+    def process_with_ai(self, text: str, detected_bandits: List[Bandit], max_bandits: int = MAX_BANDITS,
+                        lines: Optional[List[str]] = None) -> Dict[str, Any]:
         """Process text with AI (Claude or DeepSeek) using the pre-detected bandits list for accuracy"""
         service_name = "DeepSeek" if USE_DEEPSEEK else "Claude"
 
@@ -964,47 +1579,26 @@ class DocumentProcessor:
             raise Exception("Anthropic API key not configured")
         
         # Create a formatted list of detected bandits for the prompt
-        bandits_list = []
-        for bandit in detected_bandits[:max_bandits]:
-            parts = bandit.split('_')
-            if len(parts) >= 3:
-                name = parts[0]
-                age = parts[1] if parts[1] and parts[1] != 'None' else "Unknown"
-                image_id = '_'.join(parts[2:])
-                bandits_list.append(f"- {name}, Age: {age}, Image: {image_id}")
-            else:
-                # Fallback for old format
-                name = parts[0] if len(parts) > 0 else "Unknown"
-                age = parts[1] if len(parts) > 1 else "Unknown"
-                bandits_list.append(f"- {name}, Age: {age}")
-        
-        bandits_list_str = "\n".join(bandits_list)
+        bandits_list_str = "\n".join(
+            f"- {bandit.name}, Age: {bandit.age or 'Unknown'}, Image: {bandit.image_id}"
+            for bandit in detected_bandits[:max_bandits]
+        )
         
         print(f"📋 Pre-detected bandits to process:")
         for i, bandit in enumerate(detected_bandits[:max_bandits], 1):
-            parts = bandit.split('_')
-            if len(parts) >= 3:
-                name = parts[0]
-                age = parts[1] if parts[1] and parts[1] != 'None' else "Unknown"
-                image_id = '_'.join(parts[2:])
-                print(f"   {i:2d}. {name} (Age: {age}) [Image: {image_id}]")
-            else:
-                name = parts[0] if len(parts) > 0 else "Unknown"
-                age = parts[1] if len(parts) > 1 else "Unknown"
-                print(f"   {i:2d}. {name} (Age: {age})")
+            print(f"   {i:2d}. {bandit.name} (Age: {bandit.age or 'Unknown'}) [Image: {bandit.image_id}]")
         
         # Split text into manageable chunks based on detected bandits
-        text_chunks = self.split_text_by_bandits(text, detected_bandits)
+        text_chunks = self.split_text_by_bandits(text, detected_bandits, lines)
         
         # Process each chunk and combine results
         all_bandits = []
         all_events = []
         all_bandit_events = []
         
+        chunk_prompts = []
         for i, chunk in enumerate(text_chunks, 1):
-            print(f"🧩 Processing chunk {i}/{len(text_chunks)}...")
-            
-            chunk_prompt = f"""
+            chunk_prompts.append(f"""
 Extract bandits and events from this text chunk. This is part {i} of {len(text_chunks)} chunks from a larger document.
 
 IMPORTANT: You must ONLY extract the following PRE-IDENTIFIED bandits (ignore any others):
@@ -1044,23 +1638,28 @@ Text chunk:
 {chunk}
 
 Return only valid JSON with "bandit", "events", and "bandit_events" arrays.
-"""
+""")
+        
+        # DeepSeek chunks are all requested concurrently up front; Claude chunks run CLAUDE_MAX_CONCURRENT at a time
+        # in a thread pool, and results are consumed in chunk order either way
+        claude_executor = None
+        if USE_DEEPSEEK:
+            deepseek_responses = self.call_deepseek_batch(chunk_prompts)
+        else:
+            claude_executor = ThreadPoolExecutor(max_workers=CLAUDE_MAX_CONCURRENT)
+            claude_futures = [claude_executor.submit(self.call_claude_api, prompt) for prompt in chunk_prompts]
+        
+        for i, chunk_prompt in enumerate(chunk_prompts, 1):
+            print(f"🧩 Processing chunk {i}/{len(text_chunks)}...")
 
             try:
-                # Make API call to AI service for this chunk
+                # Get the AI service's response for this chunk
                 if USE_DEEPSEEK:
-                    response_text = self.call_deepseek_api(chunk_prompt)
+                    response_text = deepseek_responses[i - 1]
+                    if isinstance(response_text, Exception):
+                        raise response_text
                 else:
-                    response = ai_client.messages.create(
-                        model="claude-3-5-sonnet-20241022",
-                        max_tokens=4000,  # Smaller limit per chunk
-                        temperature=0.1,
-                        system="You are a data extraction expert. Extract ALL bandits and events from the provided text chunk. For timing info, only extract specific hours, days, or dates - ignore vague time descriptions. Return only valid JSON.",
-                        messages=[
-                            {"role": "user", "content": chunk_prompt}
-                        ]
-                    )
-                    response_text = response.content[0].text.strip()
+                    response_text = claude_futures[i - 1].result()
                 
                 # Clean up response to ensure it's valid JSON
                 if response_text.startswith("```json"):
@@ -1069,8 +1668,8 @@ Return only valid JSON with "bandit", "events", and "bandit_events" arrays.
                     response_text = response_text[:-3]
                 response_text = response_text.strip()
                 
-                # Parse JSON
-                chunk_data = json.loads(response_text)
+                # Parse JSON (orjson.JSONDecodeError subclasses json.JSONDecodeError)
+                chunk_data = orjson.loads(response_text)
                 
                 # Accumulate results
                 chunk_bandits = chunk_data.get('bandits', []) or chunk_data.get('bandit', [])
@@ -1095,11 +1694,18 @@ Return only valid JSON with "bandit", "events", and "bandit_events" arrays.
                 print(f"   ❌ Chunk {i} - API error: {str(e)}")
                 continue  # Skip this chunk but continue with others
         
+        if claude_executor:
+            # Requests not started yet are no longer needed once max_bandits is reached
+            claude_executor.shutdown(cancel_futures=True)
+        
         # Limit results to max_bandits
         all_bandits = all_bandits[:max_bandits]
         
         # Filter events and relationships to only include those related to the first max_bandits
-        bandit_ids = [bandit.get('id') for bandit in all_bandits]
+        bandit_ids = {bandit.get('id') for bandit in all_bandits}
+        events_by_id = {}
+        for event in all_events:
+            events_by_id.setdefault(event.get('id'), event)  # First event with an id wins, as in a linear search
         filtered_events = []
         filtered_relationships = []
         
@@ -1107,11 +1713,9 @@ Return only valid JSON with "bandit", "events", and "bandit_events" arrays.
             if relationship.get('bandit_id') in bandit_ids:
                 filtered_relationships.append(relationship)
                 # Find the corresponding event
-                event_id = relationship.get('event_id')
-                for event in all_events:
-                    if event.get('id') == event_id:
-                        filtered_events.append(event)
-                        break
+                event = events_by_id.get(relationship.get('event_id'))
+                if event is not None:
+                    filtered_events.append(event)
         
         # Combine all results
         structured_data = {
@@ -1135,35 +1739,36 @@ Return only valid JSON with "bandit", "events", and "bandit_events" arrays.
         """Combine structured data with image URLs"""
         print("🔗 Combining structured data with image URLs...")
         
+        # Bound once: these run for every field of every bandit and event
+        get_url = image_urls.get
+        match_reference = IMAGE_REFERENCE_PATTERN.fullmatch
+        
+        def gallery_urls(items):
+            """Yield the valid URLs in an image gallery list: resolved placeholders and items that already are URLs"""
+            for item in items:
+                # Skip non-string items and strings that can't be a placeholder or URL (one prefix check)
+                if not isinstance(item, str) or not item.startswith(("[IMAGE: ", "img_", "http")):
+                    continue
+                reference = match_reference(item)
+                if reference or item.startswith("img_"):
+                    url = get_url(reference.group(1) if reference else item, item)
+                    if url and url != item and url.startswith("http"):  # Only add valid URLs
+                        yield url
+                elif item.startswith("http"):  # Already a valid URL
+                    yield item
+        
         def replace_placeholders(value):
             if isinstance(value, str):
                 # Handle [IMAGE: placeholder_id] format
-                if value.startswith("[IMAGE: ") and value.endswith("]"):
-                    placeholder_id = value[8:-1]
-                    return image_urls.get(placeholder_id, value)
+                reference = match_reference(value)
+                if reference:
+                    return get_url(reference.group(1), value)
                 # Handle direct placeholder_id format (img_xxx_xxx)
-                elif value.startswith("img_") and value in image_urls:
-                    return image_urls.get(value, value)
+                elif value.startswith("img_"):
+                    return get_url(value, value)
             elif isinstance(value, list):
                 # Process image galleries - convert list to comma-separated string
-                urls = []
-                for item in value:
-                    if isinstance(item, str):
-                        if item.startswith("[IMAGE: ") and item.endswith("]"):
-                            placeholder_id = item[8:-1]
-                            url = image_urls.get(placeholder_id, item)
-                            if url and url != item and url.startswith("http"):  # Only add valid URLs
-                                urls.append(url)
-                        elif item.startswith("img_") and item in image_urls:
-                            url = image_urls.get(item, item)
-                            if url and url != item and url.startswith("http"):  # Only add valid URLs
-                                urls.append(url)
-                        elif item.startswith("http"):  # Already a valid URL
-                            urls.append(item)
-                    else:
-                        # Skip non-string items
-                        pass
-                return ", ".join(urls) if urls else ""
+                return ", ".join(gallery_urls(value))
             elif isinstance(value, dict):
                 return {k: replace_placeholders(v) for k, v in value.items()}
             return value
@@ -1317,6 +1922,16 @@ Return only valid JSON with "bandit", "events", and "bandit_events" arrays.
             print("⚠️  Supabase not configured, skipping truncation")
             return
         
+        # One RPC clears all three tables in a single transaction (sql/truncate_pipeline_tables.sql);
+        # only the service role may execute it
+        if SUPABASE_SERVICE_ROLE_KEY:
+            try:
+                supabase.rpc("truncate_pipeline_tables", {}).execute()
+                print("   ✅ Truncated bandit_event, event, bandit")
+                return
+            except Exception as e:
+                print(f"   ⚠️  truncate_pipeline_tables RPC unavailable ({str(e)}), deleting table by table...")
+        
         tables = ["bandit_event", "event", "bandit"]
         
         for table in tables:
@@ -1326,6 +1941,257 @@ Return only valid JSON with "bandit", "events", and "bandit_events" arrays.
             except Exception as e:
                 print(f"   ❌ Error truncating {table}: {str(e)}")
 
+    def insert_chunk(self, table: str, chunk: List[Dict[str, Any]], upsert: bool = False,
+                     progress: Optional[tqdm] = None) -> List[str]:
+        """Insert (or upsert on the table's natural key) one chunk with a single bulk request (transient errors are retried
+        with backoff), falling back to row-by-row inserts if it fails to isolate bad rows. Returns the ids of the rows that were inserted.
+        Writes are idempotent, so a retry after an attempt that committed but timed out doesn't fail on the rows it already wrote."""
+        if upsert:
+            on_conflict = ",".join(NATURAL_KEYS[table])
+            write = lambda rows: supabase.table(table).upsert(rows, on_conflict=on_conflict)
+        else:
+            # Ids are generated fresh for every run, so an id that already exists can only be this write's own row
+            write = lambda rows: supabase.table(table).upsert(rows, on_conflict="id", ignore_duplicates=True)
+        try:
+            call_with_retries(write(chunk).execute)
+            chunk_ids = [row["id"] for row in chunk]
+        except Exception as e:
+            tqdm.write(f"   ⚠️  Bulk insert of {len(chunk)} {table} rows failed ({str(e)}), retrying row by row...")
+            chunk_ids = []
+            for row in chunk:
+                try:
+                    call_with_retries(write(row).execute)
+                    chunk_ids.append(row["id"])
+                except Exception as e:
+                    tqdm.write(f"   ❌ Error inserting {table} row: {str(e)}")
+        
+        if progress is not None:
+            progress.update(len(chunk_ids))
+        return chunk_ids
+
+    def split_unchanged_rows(self, table: str, rows: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """For incremental runs: give each row that already exists in the table (same natural key) its stored id,
+        so upserts update it in place, and split off rows identical to the stored ones.
+        Keys and values are compared as column types, not as the strings PostgREST returns.
+        Returns (rows to upsert, unchanged rows)."""
+        key_columns = NATURAL_KEYS[table]
+        existing = {}
+        page_size = 1000  # PostgREST's default max rows per response
+        start = 0
+        while True:
+            page = supabase.table(table).select("*").range(start, start + page_size - 1).execute().data
+            for stored in page:
+                existing[natural_key(stored, key_columns)] = stored
+            if len(page) < page_size:
+                break
+            start += page_size
+        
+        changed_rows = []
+        unchanged_rows = []
+        for row in rows:
+            stored = existing.get(natural_key(row, key_columns))
+            if stored:
+                row["id"] = stored["id"]
+                if all(normalize_value(column, stored.get(column)) == normalize_value(column, value)
+                       for column, value in row.items()):
+                    unchanged_rows.append(row)
+                    continue
+            changed_rows.append(row)
+        
+        print(f"   ♻️  {table}: {len(changed_rows)} new or changed rows, {len(unchanged_rows)} unchanged")
+        return changed_rows, unchanged_rows
+
+    def build_relationship_rows(self, bandit_events: List[Dict[str, Any]], bandit_id_mapping: Dict[str, str],
+                                event_id_mapping: Dict[str, str]) -> List[Dict[str, Any]]:
+        """Map bandit-event relationships onto the new bandit/event ids, skipping rows with missing mappings"""
+        valid_relationships = [
+            bandit_event for bandit_event in bandit_events
+            if bandit_id_mapping.get(bandit_event.get("bandit_id")) and event_id_mapping.get(bandit_event.get("event_id"))
+        ]
+        skipped_count = len(bandit_events) - len(valid_relationships)
+        if skipped_count:
+            print(f"   ⚠️  Skipping {skipped_count} relationships: Missing mapping")
+        
+        new_ids = iter(generate_uuids(len(valid_relationships)))
+        return [
+            {
+                "id": next(new_ids),
+                "bandit_id": bandit_id_mapping[bandit_event["bandit_id"]],
+                "event_id": event_id_mapping[bandit_event["event_id"]],
+                "personal_tip": bandit_event.get("personal_tip")
+            }
+            for bandit_event in valid_relationships
+        ]
+
+    def ingest_with_rpc(self, bandit_rows: List[Dict[str, Any]], old_bandit_ids: List[str],
+                        event_rows: List[Dict[str, Any]], old_event_ids: List[List[str]],
+                        bandit_events: List[Dict[str, Any]]) -> Tuple[int, int, int]:
+        """Replace the contents of all three tables with one call to the ingest_bandits_events RPC (single transaction).
+        Returns the number of bandits, events and relationships inserted."""
+        if not SUPABASE_SERVICE_ROLE_KEY:
+            raise Exception("SUPABASE_SERVICE_ROLE_KEY not configured (ingest_bandits_events is not executable with the anon key)")
+        
+        # The RPC is all-or-nothing, so every prepared row gets its new id
+        bandit_id_mapping = dict(zip(old_bandit_ids, (row["id"] for row in bandit_rows)))
+        event_id_mapping = {old_id: row["id"] for old_ids, row in zip(old_event_ids, event_rows) for old_id in old_ids}
+        relationship_rows = self.build_relationship_rows(bandit_events, bandit_id_mapping, event_id_mapping)
+        
+        print(f"📡 Ingesting {len(bandit_rows)} bandits, {len(event_rows)} events and "
+              f"{len(relationship_rows)} relationships via ingest_bandits_events RPC...")
+        supabase.rpc("ingest_bandits_events", {"payload": {
+            "bandits": bandit_rows,
+            "events": event_rows,
+            "bandit_events": relationship_rows
+        }}).execute()
+        
+        return len(bandit_id_mapping), len(event_rows), len(relationship_rows)
+
+    def ingest_with_copy(self, bandit_rows: List[Dict[str, Any]], old_bandit_ids: List[str],
+                         event_rows: List[Dict[str, Any]], old_event_ids: List[List[str]],
+                         bandit_events: List[Dict[str, Any]]) -> Tuple[int, int, int]:
+        """Replace the contents of all three tables with COPY ... FROM STDIN in a single transaction.
+        Returns the number of bandits, events and relationships inserted."""
+        import psycopg
+        
+        if not SUPABASE_DB_URL:
+            raise Exception("SUPABASE_DB_URL not configured")
+        
+        # The transaction is all-or-nothing, so every prepared row gets its new id
+        bandit_id_mapping = dict(zip(old_bandit_ids, (row["id"] for row in bandit_rows)))
+        event_id_mapping = {old_id: row["id"] for old_ids, row in zip(old_event_ids, event_rows) for old_id in old_ids}
+        relationship_rows = self.build_relationship_rows(bandit_events, bandit_id_mapping, event_id_mapping)
+        
+        # The connection context manager commits on success and rolls back on any error
+        with psycopg.connect(SUPABASE_DB_URL) as conn:
+            with conn.cursor() as cur:
+                for table in ("bandit_event", "event", "bandit"):
+                    cur.execute(f"DELETE FROM {table}")
+                
+                for table, columns, rows in (("bandit", BANDIT_COLUMNS, bandit_rows),
+                                             ("event", EVENT_COLUMNS, event_rows),
+                                             ("bandit_event", RELATIONSHIP_COLUMNS, relationship_rows)):
+                    if not rows:
+                        continue
+                    print(f"📥 Copying {len(rows)} rows into {table}...")
+                    with cur.copy(f"COPY {table} ({', '.join(columns)}) FROM STDIN") as copy:
+                        for row in rows:
+                            copy.write_row(tuple(row.get(column) for column in columns))
+        
+        return len(bandit_id_mapping), len(event_rows), len(relationship_rows)
+
+    def insert_with_rest(self, bandit_rows: List[Dict[str, Any]], old_bandit_ids: List[str],
+                         event_rows: List[Dict[str, Any]], old_event_ids: List[List[str]],
+                         bandit_events: List[Dict[str, Any]], upsert: bool = False) -> Tuple[int, int, int]:
+        """Insert all three tables with bulk REST inserts, or with upserts of only new/changed rows when upsert is set.
+        Returns the number of bandits, events and relationships inserted (or already up to date)."""
+        # Upserts reuse the stored ids, so this must run before the id mappings are built
+        bandit_writes, unchanged_bandits = bandit_rows, []
+        event_writes, unchanged_events = event_rows, []
+        if upsert:
+            bandit_writes, unchanged_bandits = self.split_unchanged_rows("bandit", bandit_rows)
+            event_writes, unchanged_events = self.split_unchanged_rows("event", event_rows)
+        
+        # Relationship rows are built up front against the prepared ids; each one is queued as soon as both its
+        # bandit and its event chunks are in, so relationship chunks overlap with the remaining bandit/event chunks
+        bandit_id_mapping = dict(zip(old_bandit_ids, (row["id"] for row in bandit_rows)))
+        event_id_mapping = {old_id: row["id"] for old_ids, row in zip(old_event_ids, event_rows) for old_id in old_ids}
+        relationship_rows = []
+        if bandit_events:
+            print(f"🔗 Inserting {len(bandit_events)} relationships alongside bandits and events...")
+            relationship_rows = self.build_relationship_rows(bandit_events, bandit_id_mapping, event_id_mapping)
+        unchanged_relationships = []
+        if upsert and relationship_rows:
+            relationship_rows, unchanged_relationships = self.split_unchanged_rows("bandit_event", relationship_rows)
+        
+        waiting_on = defaultdict(list)  # new bandit/event id -> indexes of relationship rows that need it
+        for i, relationship in enumerate(relationship_rows):
+            waiting_on[relationship["bandit_id"]].append(i)
+            waiting_on[relationship["event_id"]].append(i)
+        missing_count = [2] * len(relationship_rows)
+        ready_relationships = []
+        
+        inserted_bandit_ids = set()
+        inserted_event_ids = set()
+        
+        def mark_inserted(row_ids: List[str], inserted_ids: set):
+            inserted_ids.update(row_ids)
+            for row_id in row_ids:
+                for i in waiting_on.pop(row_id, ()):
+                    missing_count[i] -= 1
+                    if not missing_count[i]:
+                        ready_relationships.append(relationship_rows[i])
+        
+        # Unchanged rows are already stored, so relationships that only need them are ready right away
+        mark_inserted([row["id"] for row in unchanged_bandits], inserted_bandit_ids)
+        mark_inserted([row["id"] for row in unchanged_events], inserted_event_ids)
+        
+        # One progress line per table, advanced per chunk instead of printing per row
+        progress = {}
+        for position, (table, total, done) in enumerate((("bandit", len(bandit_rows), len(unchanged_bandits)),
+                                                          ("event", len(event_rows), len(unchanged_events)),
+                                                          ("bandit_event", len(relationship_rows) + len(unchanged_relationships),
+                                                           len(unchanged_relationships)))):
+            progress[table] = tqdm(total=total, initial=done, desc=f"   {table}", unit="row", position=position)
+        
+        relationship_futures = []
+        with ThreadPoolExecutor(max_workers=INSERT_WORKERS) as executor:
+            futures = {}
+            for table, rows, inserted_ids in (("bandit", bandit_writes, inserted_bandit_ids),
+                                              ("event", event_writes, inserted_event_ids)):
+                for start in range(0, len(rows), INSERT_BATCH_SIZE):
+                    future = executor.submit(self.insert_chunk, table, rows[start:start + INSERT_BATCH_SIZE], upsert,
+                                             progress[table])
+                    futures[future] = inserted_ids
+            
+            for future in as_completed(futures):
+                mark_inserted(future.result(), futures[future])
+                
+                while len(ready_relationships) >= INSERT_BATCH_SIZE:
+                    relationship_futures.append(executor.submit(self.insert_chunk, "bandit_event",
+                                                                ready_relationships[:INSERT_BATCH_SIZE], upsert,
+                                                                progress["bandit_event"]))
+                    del ready_relationships[:INSERT_BATCH_SIZE]
+            
+            if ready_relationships:
+                relationship_futures.append(executor.submit(self.insert_chunk, "bandit_event", ready_relationships, upsert,
+                                                            progress["bandit_event"]))
+            rel_inserted = len(unchanged_relationships) + sum(len(future.result()) for future in relationship_futures)
+        
+        for bar in progress.values():
+            bar.close()
+        
+        failed_dependencies = sum(1 for count in missing_count if count)
+        if failed_dependencies:
+            print(f"   ⚠️  Skipped {failed_dependencies} relationships: bandit or event insert failed")
+        if bandit_events:
+            print(f"   ✅ Inserted {rel_inserted} relationships")
+        
+        for i, bandit_data in enumerate(bandit_rows, 1):
+            if bandit_data["id"] in inserted_bandit_ids:
+                vprint(f"   ✅ Bandit {i}: {bandit_data['name']}")
+        
+        for i, event_data in enumerate(event_rows, 1):
+            if not VERBOSE:
+                break
+            if event_data["id"] not in inserted_event_ids:
+                continue
+            
+            # Log timing info and geocoding status (read back from the prepared row, no second lookup)
+            timing_info = event_data["timing_info"]
+            lat = event_data["location_lat"]
+            lng = event_data["location_lng"]
+            
+            status_parts = []
+            if timing_info and timing_info.strip():
+                status_parts.append(f"TIMING: {timing_info}")
+            if lat is not None and lng is not None:
+                status_parts.append(f"GEO: {lat:.6f}, {lng:.6f}")
+            
+            status_str = " | ".join(status_parts) if status_parts else "No timing info or coordinates"
+            vprint(f"   ✅ Event {i}: {event_data['name']} - {status_str}")
+        
+        return len(inserted_bandit_ids), len(inserted_event_ids), rel_inserted
+
     def insert_to_database(self, data: Dict[str, Any]):
         """Insert all data into Supabase database"""
         print("📊 Inserting data into database...")
@@ -1333,243 +2199,233 @@ Return only valid JSON with "bandit", "events", and "bandit_events" arrays.
         if not supabase:
             raise Exception("Supabase not configured")
         
-        # Truncate existing data
-        self.truncate_database_tables()
+        bandits = data.get('bandit', []) or []
+        events = data.get('events', []) or []
+        bandit_events = data.get('bandit_events', []) or []
         
-        # Track ID mappings for relationships
-        bandit_id_mapping = {}
-        event_id_mapping = {}
+        if not FULL_REFRESH and INGEST_METHOD != "rest":
+            raise Exception('FULL_REFRESH=0 is only supported with INGEST_METHOD = "rest"')
         
-        # Insert bandits
-        print(f"👥 Inserting {len(data.get('bandit', []))} bandits...")
-        for i, bandit in enumerate(data.get('bandit', []), 1):
-            try:
-                new_id = str(uuid.uuid4())
-                old_id = bandit.get('id')
-                
-                bandit_data = {
-                    "id": new_id,
-                    "name": bandit.get("name"),
-                    "age": bandit.get("age"),
-                    "city": bandit.get("city"),
-                    "occupation": bandit.get("occupation"),
-                    "rating": bandit.get("rating", 0),
-                    "image_url": bandit.get("image_url"),
-                    "description": bandit.get("description"),
-                    "family_name": bandit.get("family_name")
-                }
-                
-                supabase.table("bandit").insert(bandit_data).execute()
-                bandit_id_mapping[old_id] = new_id
-                print(f"   ✅ Bandit {i}: {bandit.get('name')}")
-                
-            except Exception as e:
-                print(f"   ❌ Error inserting bandit: {str(e)}")
+        # Truncate existing data (the RPC and COPY paths clear the tables inside their own transaction;
+        # incremental runs upsert into the existing rows instead)
+        if FULL_REFRESH and (INGEST_METHOD == "rest" or not (bandits or events or bandit_events)):
+            self.truncate_database_tables()
         
-        # Insert events
-        print(f"🎉 Inserting {len(data.get('events', []))} events...")
-        for i, event in enumerate(data.get('events', []), 1):
-            try:
-                new_id = str(uuid.uuid4())
-                old_id = event.get('id')
-                
-                event_data = {
-                    "id": new_id,
-                    "name": event.get("name"),
-                    "genre": event.get("genre"),
-                    "description": event.get("description"),
-                    "rating": event.get("rating", 0),
-                    "image_url": event.get("image_url"),
-                    "link": event.get("link"),
-                    "address": event.get("address"),
-                    "city": event.get("city"),
-                    "neighborhood": event.get("neighborhood"),
-                    "start_time": event.get("start_time") or "2024-01-01T18:00:00Z",
-                    "end_time": event.get("end_time") or "2024-01-01T23:00:00Z",
-                    "timing_info": event.get("timing_info", ""),
-                    "location_lat": event.get("latitude"),
-                    "location_lng": event.get("longitude")
-                }
-                
-                # Only include image_gallery if it exists and is not empty/None
-                if "image_gallery" in event and event.get("image_gallery") is not None and event.get("image_gallery"):
-                    event_data["image_gallery"] = event.get("image_gallery")
-                
-                supabase.table("event").insert(event_data).execute()
-                event_id_mapping[old_id] = new_id
-                
-                # Log timing info and geocoding status
-                timing_info = event.get("timing_info", "")
-                lat = event.get("latitude")  # Internal field name
-                lng = event.get("longitude")  # Internal field name
-                
-                status_parts = []
-                if timing_info and timing_info.strip():
-                    status_parts.append(f"TIMING: {timing_info}")
-                if lat is not None and lng is not None:
-                    status_parts.append(f"GEO: {lat:.6f}, {lng:.6f}")
-                
-                status_str = " | ".join(status_parts) if status_parts else "No timing info or coordinates"
-                print(f"   ✅ Event {i}: {event.get('name')} - {status_str}")
-                
-            except Exception as e:
-                print(f"   ❌ Error inserting event: {str(e)}")
+        if not (bandits or events or bandit_events):
+            print("⚠️  No bandits, events or relationships to insert")
+            return
         
-        # Insert bandit-event relationships
-        print(f"🔗 Inserting {len(data.get('bandit_events', []))} relationships...")
-        for i, bandit_event in enumerate(data.get('bandit_events', []), 1):
-            try:
-                old_bandit_id = bandit_event.get("bandit_id")
-                old_event_id = bandit_event.get("event_id")
-                
-                new_bandit_id = bandit_id_mapping.get(old_bandit_id)
-                new_event_id = event_id_mapping.get(old_event_id)
-                
-                if not new_bandit_id or not new_event_id:
-                    print(f"   ⚠️  Skipping relationship {i}: Missing mapping")
-                    continue
-                
-                relationship_data = {
-                    "id": str(uuid.uuid4()),
-                    "bandit_id": new_bandit_id,
-                    "event_id": new_event_id,
-                    "personal_tip": bandit_event.get("personal_tip")
-                }
-                
-                supabase.table("bandit_event").insert(relationship_data).execute()
-                print(f"   ✅ Relationship {i}")
-                
-            except Exception as e:
-                print(f"   ❌ Error inserting relationship: {str(e)}")
+        # Prepare bandit rows
+        print(f"👥 Inserting {len(bandits)} bandits...")
+        bandit_rows = []
+        old_bandit_ids = []
+        new_ids = iter(generate_uuids(len(bandits)))
+        for bandit in bandits:
+            bandit_rows.append({"id": next(new_ids), **project_row(bandit, BANDIT_FIELDS)})
+            old_bandit_ids.append(bandit.get('id'))
+        
+        # Prepare event rows, collapsing duplicates (same natural key, as the UNIQUE constraint compares it) into one row;
+        # old_event_ids holds every source id per row so relationships to a duplicate still resolve
+        event_rows = []
+        old_event_ids = []
+        rows_by_key = {}
+        new_ids = iter(generate_uuids(len(events)))
+        for event in events:
+            event_data = project_row(event, EVENT_FIELDS)
+            key = natural_key(event_data, NATURAL_KEYS["event"])
+            if key in rows_by_key:
+                old_event_ids[rows_by_key[key]].append(event.get('id'))
+                continue
+            rows_by_key[key] = len(event_rows)
+            
+            event_data = {"id": next(new_ids), **event_data}
+            # Every row carries image_gallery (NULL when empty) so all rows in a bulk insert have the same keys
+            event_data["image_gallery"] = event_data["image_gallery"] or None
+            
+            event_rows.append(event_data)
+            old_event_ids.append([event.get('id')])
+        
+        duplicate_count = len(events) - len(event_rows)
+        if duplicate_count:
+            print(f"   ⚠️  Skipping {duplicate_count} duplicate events")
+        print(f"🎉 Inserting {len(event_rows)} events...")
+        
+        if INGEST_METHOD == "rpc":
+            counts = self.ingest_with_rpc(bandit_rows, old_bandit_ids, event_rows, old_event_ids, bandit_events)
+        elif INGEST_METHOD == "copy":
+            counts = self.ingest_with_copy(bandit_rows, old_bandit_ids, event_rows, old_event_ids, bandit_events)
+        else:
+            counts = self.insert_with_rest(bandit_rows, old_bandit_ids, event_rows, old_event_ids, bandit_events,
+                                           upsert=not FULL_REFRESH)
+        bandit_count, event_count, rel_inserted = counts
         
         print("\n📊 Database population complete!")
-        print(f"   👥 Bandits: {len(bandit_id_mapping)}")
-        print(f"   🎉 Events: {len(event_id_mapping)}")
-        print(f"   🔗 Relationships: {len([r for r in data.get('bandit_events', []) if bandit_id_mapping.get(r.get('bandit_id')) and event_id_mapping.get(r.get('event_id'))])}")
+        print(f"   👥 Bandits: {bandit_count}")
+        print(f"   🎉 Events: {event_count}")
+        print(f"   🔗 Relationships: {rel_inserted}")
 
     def print_statistics(self):
         """Print detailed statistics about the data in the database"""
-        print("\n📊 DATABASE STATISTICS")
-        print("=" * 50)
+        # Output is collected and written in one call at the end instead of one write per line
+        lines = []
+        emit = lines.append
+        try:
+            emit("\n📊 DATABASE STATISTICS")
+            emit("=" * 50)
         
-        if not supabase:
-            print("❌ Supabase not configured, cannot fetch statistics")
-            return
+            if not supabase:
+                emit("❌ Supabase not configured, cannot fetch statistics")
+                return
         
-        try:
-            # Get all data from database
-            bandits_response = supabase.table("bandit").select("*").execute()
-            events_response = supabase.table("event").select("*").execute()
-            bandit_events_response = supabase.table("bandit_event").select("*").execute()
+            try:
+                # Get all data from database (the three tables are fetched concurrently)
+                with ThreadPoolExecutor(max_workers=3) as executor:
+                    bandits_response, events_response, bandit_events_response = executor.map(
+                        lambda table: supabase.table(table).select("*").execute(), ["bandit", "event", "bandit_event"]
+                    )
             
-            bandits = bandits_response.data
-            events = events_response.data
-            bandit_events = bandit_events_response.data
+                bandits = bandits_response.data
+                events = events_response.data
+                bandit_events = bandit_events_response.data
             
-            # Total number of bandits
-            print(f"📊 TOTAL NUMBER OF BANDITS: {len(bandits)}")
+                # Index the relationships once: each bandit's event ids, and every event id that has a bandit
+                event_ids_by_bandit = defaultdict(set)
+                associated_event_ids = set()
+                for be in bandit_events:
+                    event_ids_by_bandit[be['bandit_id']].add(be['event_id'])
+                    associated_event_ids.add(be['event_id'])
             
-            # Total number of events
-            print(f"📊 TOTAL NUMBER OF EVENTS: {len(events)}")
+                # Total number of bandits
+                emit(f"📊 TOTAL NUMBER OF BANDITS: {len(bandits)}")
             
-            # List of bandits with their events
-            print("\n👥 BANDITS AND THEIR EVENTS:")
-            print("-" * 40)
+                # Total number of events
+                emit(f"📊 TOTAL NUMBER OF EVENTS: {len(events)}")
             
-            for bandit in bandits:
-                bandit_id = bandit['id']
-                bandit_name = bandit['name']
+                # List of bandits with their events
+                emit("\n👥 BANDITS AND THEIR EVENTS:")
+                emit("-" * 40)
+            
+                event_positions = {e['id']: position for position, e in enumerate(events)}
+            
+                for bandit in bandits:
+                    bandit_id = bandit['id']
+                    bandit_name = bandit['name']
                 
-                # Find events for this bandit
-                related_event_ids = [be['event_id'] for be in bandit_events if be['bandit_id'] == bandit_id]
-                related_events = [e for e in events if e['id'] in related_event_ids]
+                    # Find events for this bandit (listed in table order, each once)
+                    related_positions = sorted(event_positions[event_id] for event_id in event_ids_by_bandit.get(bandit_id, ())
+                                               if event_id in event_positions)
+                    related_events = [events[position] for position in related_positions]
                 
-                print(f"🎯 {bandit_name}")
-                print(f"   Number of events: {len(related_events)}")
-                if related_events:
-                    for event in related_events:
-                        print(f"   - {event['name']}")
-                else:
-                    print("   - No events")
-                print()
+                    emit(f"🎯 {bandit_name}")
+                    emit(f"   Number of events: {len(related_events)}")
+                    if related_events:
+                        for event in related_events:
+                            emit(f"   - {event['name']}")
+                    else:
+                        emit("   - No events")
+                    emit("")
             
-            # Events not associated with any bandit
-            associated_event_ids = set(be['event_id'] for be in bandit_events)
-            unassociated_events = [e for e in events if e['id'] not in associated_event_ids]
-            print(f"🔗 NUMBER OF EVENTS NOT ASSOCIATED WITH A BANDIT: {len(unassociated_events)}")
-            if unassociated_events:
-                for event in unassociated_events:
-                    print(f"   - {event['name']}")
+                # Sort events into every report category in a single pass
+                unassociated_events = []
+                events_with_timing = []
+                events_without_location = []
+                events_without_main_image = []
+                events_without_gallery = []
+                events_with_coordinates = []
+                events_without_coordinates = []
+                get = dict.get  # Bound once instead of looking up e.get for every field of every event
+                for e in events:
+                    timing_info = get(e, 'timing_info')
+                    address = get(e, 'address')
+                    image_url = get(e, 'image_url')
+                    image_gallery = get(e, 'image_gallery')
+                    if e['id'] not in associated_event_ids:
+                        unassociated_events.append(e)
+                    # isspace() tests for blank text like "not s.strip()" without building a stripped copy
+                    if timing_info and not timing_info.isspace():
+                        events_with_timing.append(e)
+                    if not address or address.isspace():
+                        events_without_location.append(e)
+                    if not image_url or image_url.isspace():
+                        events_without_main_image.append(e)
+                    if not image_gallery or image_gallery.isspace():
+                        events_without_gallery.append(e)
+                    latitude = get(e, 'latitude')
+                    longitude = get(e, 'longitude')
+                    if latitude is not None and longitude is not None:
+                        events_with_coordinates.append((e['name'], latitude, longitude))
+                    else:
+                        events_without_coordinates.append(e)
             
-            # Events with timing info
-            events_with_timing = [e for e in events if e.get('timing_info') and e['timing_info'].strip()]
-            print(f"\n⏰ NUMBER OF EVENTS WITH TIMING INFO: {len(events_with_timing)}")
-            if events_with_timing:
-                print("   Events with timing info:")
-                for event in events_with_timing:
-                    print(f"   - {event['name']}: {event['timing_info']}")
+                # Events not associated with any bandit
+                emit(f"🔗 NUMBER OF EVENTS NOT ASSOCIATED WITH A BANDIT: {len(unassociated_events)}")
+                if VERBOSE_STATS and unassociated_events:
+                    for event in unassociated_events:
+                        emit(f"   - {event['name']}")
             
-            # Events without location (address)
-            events_without_location = [e for e in events if not e.get('address') or not e['address'].strip()]
-            print(f"\n📍 NUMBER OF EVENTS WITHOUT LOCATION: {len(events_without_location)}")
-            if events_without_location:
-                print("   Events without location:")
-                for event in events_without_location:
-                    print(f"   - {event['name']}")
+                # Events with timing info
+                emit(f"\n⏰ NUMBER OF EVENTS WITH TIMING INFO: {len(events_with_timing)}")
+                if VERBOSE_STATS and events_with_timing:
+                    emit("   Events with timing info:")
+                    for event in events_with_timing:
+                        emit(f"   - {event['name']}: {event['timing_info']}")
             
-            # Events with no main image
-            events_without_main_image = [e for e in events if not e.get('image_url') or not e['image_url'].strip()]
-            print(f"\n🖼️ NUMBER OF EVENTS WITH NO MAIN IMAGE: {len(events_without_main_image)}")
-            if events_without_main_image:
-                print("   Events without main image:")
-                for event in events_without_main_image:
-                    print(f"   - {event['name']}")
+                # Events without location (address)
+                emit(f"\n📍 NUMBER OF EVENTS WITHOUT LOCATION: {len(events_without_location)}")
+                if VERBOSE_STATS and events_without_location:
+                    emit("   Events without location:")
+                    for event in events_without_location:
+                        emit(f"   - {event['name']}")
             
-            # Events with no gallery
-            events_without_gallery = [e for e in events if not e.get('image_gallery') or not e['image_gallery'].strip()]
-            print(f"\n🎨 NUMBER OF EVENTS WITH NO GALLERY: {len(events_without_gallery)}")
-            if events_without_gallery:
-                print("   Events without gallery:")
-                for event in events_without_gallery:
-                    print(f"   - {event['name']}")
+                # Events with no main image
+                emit(f"\n🖼️ NUMBER OF EVENTS WITH NO MAIN IMAGE: {len(events_without_main_image)}")
+                if VERBOSE_STATS and events_without_main_image:
+                    emit("   Events without main image:")
+                    for event in events_without_main_image:
+                        emit(f"   - {event['name']}")
             
-            # Events with geocoding coordinates
-            events_with_coordinates = [e for e in events if e.get('latitude') is not None and e.get('longitude') is not None]
-            events_without_coordinates = [e for e in events if e.get('latitude') is None or e.get('longitude') is None]
-            print(f"\n🌍 NUMBER OF EVENTS WITH COORDINATES (GEOCODED): {len(events_with_coordinates)}")
-            if events_with_coordinates:
-                print("   Events with coordinates:")
-                for event in events_with_coordinates:
-                    lat = event.get('latitude')
-                    lng = event.get('longitude')
-                    print(f"   - {event['name']}: {lat:.6f}, {lng:.6f}")
+                # Events with no gallery
+                emit(f"\n🎨 NUMBER OF EVENTS WITH NO GALLERY: {len(events_without_gallery)}")
+                if VERBOSE_STATS and events_without_gallery:
+                    emit("   Events without gallery:")
+                    for event in events_without_gallery:
+                        emit(f"   - {event['name']}")
             
-            print(f"\n📍 NUMBER OF EVENTS WITHOUT COORDINATES: {len(events_without_coordinates)}")
-            if events_without_coordinates:
-                print("   Events without coordinates:")
-                for event in events_without_coordinates:
-                    print(f"   - {event['name']}")
+                # Events with geocoding coordinates
+                emit(f"\n🌍 NUMBER OF EVENTS WITH COORDINATES (GEOCODED): {len(events_with_coordinates)}")
+                if VERBOSE_STATS and events_with_coordinates:
+                    emit("   Events with coordinates:")
+                    format_coordinates = "   - {}: {:.6f}, {:.6f}".format
+                    for name, latitude, longitude in events_with_coordinates:
+                        emit(format_coordinates(name, latitude, longitude))
             
-            # Show geocoding cache information
-            try:
-                cache_path = Path(GEOCODING_CACHE_FILE)
-                if cache_path.exists():
-                    with open(cache_path, 'r', encoding='utf-8') as f:
-                        cache = json.load(f)
-                    cache_entries = len(cache)
-                    successful_cache_entries = sum(1 for entry in cache.values() if entry.get('latitude') is not None)
-                    print(f"\n💾 GEOCODING CACHE STATUS:")
-                    print(f"   📋 Total cached addresses: {cache_entries}")
-                    print(f"   ✅ Successfully geocoded in cache: {successful_cache_entries}")
-                    print(f"   ❌ Failed geocoding attempts in cache: {cache_entries - successful_cache_entries}")
-            except Exception:
-                pass  # Don't fail statistics if cache can't be read
+                emit(f"\n📍 NUMBER OF EVENTS WITHOUT COORDINATES: {len(events_without_coordinates)}")
+                if VERBOSE_STATS and events_without_coordinates:
+                    emit("   Events without coordinates:")
+                    for event in events_without_coordinates:
+                        emit(f"   - {event['name']}")
             
-            print("\n" + "=" * 50)
-            print("📊 STATISTICS COMPLETE")
+                # Show geocoding cache information
+                try:
+                    if self.geocoding_cache is not None or Path(GEOCODING_CACHE_DB).exists():
+                        cache = self.geocoding_cache if self.geocoding_cache is not None else GeocodingCache()
+                        cache_entries = len(cache)
+                        successful_cache_entries = cache.successful_count()
+                        emit(f"\n💾 GEOCODING CACHE STATUS:")
+                        emit(f"   📋 Total cached addresses: {cache_entries}")
+                        emit(f"   ✅ Successfully geocoded in cache: {successful_cache_entries}")
+                        emit(f"   ❌ Failed geocoding attempts in cache: {cache_entries - successful_cache_entries}")
+                except sqlite3.Error as e:
+                    emit(f"\n⚠️  Could not read geocoding cache: {e}")  # Don't fail statistics if cache can't be read
             
-        except Exception as e:
-            print(f"❌ Error fetching statistics: {str(e)}")
+                emit("\n" + "=" * 50)
+                emit("📊 STATISTICS COMPLETE")
+            
+            except Exception as e:
+                emit(f"❌ Error fetching statistics: {str(e)}")
+        finally:
+            sys.stdout.write("\n".join(lines) + "\n")
+            sys.stdout.flush()
 
     def process_document(self):
         """Main pipeline to process document from DOCX to database"""
@@ -1588,11 +2444,8 @@ Return only valid JSON with "bandit", "events", and "bandit_events" arrays.
             # Step 3: Extract text with image placeholders (first 10 pages)
             extraction_result = self.extract_text_with_placeholders()
 
-            # Step 4a: Get bandit patterns for local image saving
-            bandit_patterns = self.find_bandit_patterns_in_lines(
-                extraction_result["readable_text"].split('\n'),
-                max_bandits=MAX_BANDITS
-            )
+            # Step 4a: Get bandit patterns for local image saving (found during extraction)
+            bandit_patterns = extraction_result["bandit_patterns"]
 
             # Step 4b: Save bandit images locally with proper naming
             self.save_bandit_images_locally(extraction_result["image_data"], bandit_patterns)
@@ -1602,7 +2455,8 @@ Return only valid JSON with "bandit", "events", and "bandit_events" arrays.
 
             # Step 5: Process with AI using pre-detected bandits
             detected_bandits = extraction_result["detected_bandits_list"]
-            structured_data = self.process_with_ai(extraction_result["readable_text"], detected_bandits, max_bandits=MAX_BANDITS)
+            structured_data = self.process_with_ai(extraction_result["readable_text"], detected_bandits, max_bandits=MAX_BANDITS,
+                                                   lines=extraction_result["lines"])
             
             # Step 6: Combine data with image URLs
             final_data = self.combine_data_with_images(structured_data, image_urls)
@@ -1621,8 +2475,11 @@ Return only valid JSON with "bandit", "events", and "bandit_events" arrays.
             if not DRY_RUN:
                 self.insert_to_database(final_data)
 
-            # Step 10: Print statistics
-            self.print_statistics()
+            # Step 10: Print statistics (nothing was written in a dry run, so skip the fetches)
+            if DRY_RUN:
+                print("⏭️  Dry run: skipping database statistics")
+            else:
+                self.print_statistics()
             
             print("✅ Complete pipeline finished successfully!")
             print(f"🎯 Processed first {MAX_BANDITS} bandits from {self.pdf_path.name}")
@@ -1643,17 +2500,13 @@ def main():
         sys.exit(1)
     
     # Verify environment setup
-    missing_vars = []
-    if not SUPABASE_URL:
-        missing_vars.append("SUPABASE_URL")
-    if not SUPABASE_KEY:
-        missing_vars.append("SUPABASE_ANON_KEY")
-    if USE_DEEPSEEK and not DEEPSEEK_API_KEY:
-        missing_vars.append("DEEPSEEK_API_KEY")
-    elif not USE_DEEPSEEK and not ANTHROPIC_API_KEY:
-        missing_vars.append("ANTHROPIC_API_KEY")
-    if not BUCKET_NAME:
-        missing_vars.append("BUCKET_NAME")
+    required_vars = {
+        "SUPABASE_URL": SUPABASE_URL,
+        "SUPABASE_ANON_KEY or SUPABASE_SERVICE_ROLE_KEY": SUPABASE_KEY,
+        "DEEPSEEK_API_KEY" if USE_DEEPSEEK else "ANTHROPIC_API_KEY": DEEPSEEK_API_KEY if USE_DEEPSEEK else ANTHROPIC_API_KEY,
+        "BUCKET_NAME": BUCKET_NAME
+    }
+    missing_vars = [name for name, value in required_vars.items() if not value]
     
     if missing_vars:
         print(f"❌ Missing environment variables: {', '.join(missing_vars)}")
@@ -1674,7 +2527,7 @@ def main():
         else:
             print("⚠️  No Google Maps API key - falling back to Nominatim (free)")
     
-    print(f"💾 Geocoding cache file: {GEOCODING_CACHE_FILE}")
+    print(f"💾 Geocoding cache file: {GEOCODING_CACHE_DB}")
     
     # Show AI service configuration
     ai_service = "DeepSeek" if USE_DEEPSEEK else "Claude"
@@ -0,0 +1,50 @@
+-- Atomic multi-table ingest used by docx_to_database.py when INGEST_METHOD = "rpc".
+-- Rows arrive with client-generated ids (the old->new id mapping is resolved in Python),
+-- so clearing the old data and inserting all three tables happen in a single transaction
+-- with one network call; a failure leaves the previous data untouched.
+-- security definer bypasses RLS, so only the service role may execute it (the anon key ships in the app);
+-- the script must run with SUPABASE_SERVICE_ROLE_KEY to call it.
+create or replace function ingest_bandits_events(payload jsonb)
+returns jsonb
+language plpgsql
+security definer
+set search_path = public
+as $$
+declare
+  bandit_count integer;
+  event_count integer;
+  relationship_count integer;
+begin
+  -- Same clearing as truncate_pipeline_tables(); DELETE rather than TRUNCATE ... CASCADE so
+  -- user tables referencing bandit/event (likes, reviews) are not wiped along with them
+  delete from bandit_event where true;
+  delete from event where true;
+  delete from bandit where true;
+
+  insert into bandit (id, name, age, city, occupation, rating, image_url, description, family_name)
+  select id, name, age, city, occupation, rating, image_url, description, family_name
+  from jsonb_populate_recordset(null::bandit, coalesce(payload->'bandits', '[]'::jsonb));
+  get diagnostics bandit_count = row_count;
+
+  insert into event (id, name, genre, description, rating, image_url, link, address, city, neighborhood,
+                     start_time, end_time, timing_info, location_lat, location_lng, image_gallery)
+  select id, name, genre, description, rating, image_url, link, address, city, neighborhood,
+         start_time, end_time, timing_info, location_lat, location_lng, image_gallery
+  from jsonb_populate_recordset(null::event, coalesce(payload->'events', '[]'::jsonb));
+  get diagnostics event_count = row_count;
+
+  insert into bandit_event (id, bandit_id, event_id, personal_tip)
+  select id, bandit_id, event_id, personal_tip
+  from jsonb_populate_recordset(null::bandit_event, coalesce(payload->'bandit_events', '[]'::jsonb));
+  get diagnostics relationship_count = row_count;
+
+  return jsonb_build_object(
+    'bandits', bandit_count,
+    'events', event_count,
+    'relationships', relationship_count
+  );
+end;
+$$;
+
+revoke execute on function ingest_bandits_events(jsonb) from public, anon, authenticated;
+grant execute on function ingest_bandits_events(jsonb) to service_role;
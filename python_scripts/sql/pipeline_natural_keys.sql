@@ -0,0 +1,7 @@
+-- UNIQUE constraints on the natural keys docx_to_database.py upserts on when FULL_REFRESH=0
+-- (insert_chunk passes them as on_conflict, so an existing row is updated in place instead of duplicated).
+-- NULLS NOT DISTINCT (Postgres 15+) so a bandit without family_name or an event without address still
+-- identifies a single row. Delete duplicates left by earlier incremental runs before adding these.
+alter table bandit add constraint bandit_natural_key unique nulls not distinct (name, family_name);
+alter table event add constraint event_natural_key unique nulls not distinct (name, start_time, address);
+alter table bandit_event add constraint bandit_event_natural_key unique (bandit_id, event_id);
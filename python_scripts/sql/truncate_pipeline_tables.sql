@@ -0,0 +1,22 @@
+-- Clears the pipeline tables for docx_to_database.py's truncate_database_tables() in one call
+-- (one round trip, one transaction, no deleted rows sent back).
+-- DELETE rather than TRUNCATE ... CASCADE so user tables referencing bandit/event
+-- (likes, reviews) are not wiped along with them; plain TRUNCATE is refused while those
+-- foreign keys exist.
+-- security definer bypasses RLS, so only the service role may execute it (the anon key ships in the app);
+-- the script calls it only when SUPABASE_SERVICE_ROLE_KEY is set.
+create or replace function truncate_pipeline_tables()
+returns void
+language plpgsql
+security definer
+set search_path = public
+as $$
+begin
+  delete from bandit_event where true;
+  delete from event where true;
+  delete from bandit where true;
+end;
+$$;
+
+revoke execute on function truncate_pipeline_tables() from public, anon, authenticated;
+grant execute on function truncate_pipeline_tables() to service_role;
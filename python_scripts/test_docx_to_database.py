@@ -0,0 +1,121 @@
+"""Tests for the database write paths of docx_to_database.py"""
+from types import SimpleNamespace
+
+import pytest
+
+for module in ("fitz", "cv2", "httpx", "supabase", "anthropic"):
+    pytest.importorskip(module)
+
+import docx_to_database as pipeline
+import httpx
+from postgrest.exceptions import APIError
+
+
+class StoredTable:
+    """Stands in for supabase.table(name): serves the given rows through select("*").range(...).execute()"""
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def select(self, *columns):
+        return self
+
+    def range(self, start, end):
+        self.page = self.rows[start:end + 1]
+        return self
+
+    def execute(self):
+        return SimpleNamespace(data=self.page)
+
+
+class CommitThenTimeoutTable:
+    """Stands in for supabase.table(name) on a flaky connection: the first request commits its rows on the server,
+    but its response times out. Writing an id that already exists fails like Postgres unless it is ON CONFLICT (id)."""
+
+    def __init__(self):
+        self.rows = {}
+        self.requests = 0
+
+    def insert(self, rows):
+        return self.write(rows, on_conflict="", ignore_duplicates=False)
+
+    def upsert(self, rows, on_conflict="", ignore_duplicates=False):
+        return self.write(rows, on_conflict, ignore_duplicates)
+
+    def write(self, rows, on_conflict, ignore_duplicates):
+        rows = rows if isinstance(rows, list) else [rows]
+        return SimpleNamespace(execute=lambda: self.execute(rows, on_conflict, ignore_duplicates))
+
+    def execute(self, rows, on_conflict, ignore_duplicates):
+        self.requests += 1
+        if on_conflict != "id" and any(row["id"] in self.rows for row in rows):
+            raise APIError({"code": "23505", "message": "duplicate key value violates unique constraint"})
+        for row in rows:
+            if not (ignore_duplicates and row["id"] in self.rows):
+                self.rows[row["id"]] = row
+        if self.requests == 1:
+            raise httpx.ReadTimeout("response lost after commit")
+        return SimpleNamespace(data=rows)
+
+
+@pytest.fixture
+def processor(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # DocumentProcessor creates its output directory in the working directory
+    return pipeline.DocumentProcessor("bandits.docx")
+
+
+def store(monkeypatch, rows):
+    monkeypatch.setattr(pipeline, "supabase", SimpleNamespace(table=lambda name: StoredTable(rows)))
+
+
+def event_row(**fields):
+    """An event row prepared the way insert_to_database prepares it"""
+    row = {"id": "new-id", **pipeline.project_row(fields, pipeline.EVENT_FIELDS)}
+    row["image_gallery"] = row["image_gallery"] or None
+    return row
+
+
+def test_round_tripped_event_is_unchanged(processor, monkeypatch):
+    row = event_row(name="Jazz night", address="Odos 1", rating="4")
+    # PostgREST returns timestamptz with a +00:00 offset and integer columns as numbers
+    store(monkeypatch, [{**row, "id": "stored-id", "rating": 4,
+                         "start_time": "2024-01-01T18:00:00+00:00", "end_time": "2024-01-01T23:00:00+00:00"}])
+
+    changed, unchanged = processor.split_unchanged_rows("event", [row])
+
+    assert changed == []
+    assert unchanged == [row]
+    assert row["id"] == "stored-id"
+
+
+def test_round_tripped_bandit_is_unchanged(processor, monkeypatch):
+    row = {"id": "new-id", **pipeline.project_row({"name": "Maria", "age": "32"}, pipeline.BANDIT_FIELDS)}
+    store(monkeypatch, [{**row, "id": "stored-id", "age": 32}])
+
+    changed, unchanged = processor.split_unchanged_rows("bandit", [row])
+
+    assert (changed, unchanged) == ([], [row])
+
+
+def test_edited_event_keeps_stored_id(processor, monkeypatch):
+    row = event_row(name="Jazz night", address="Odos 1", description="Now with a late set")
+    store(monkeypatch, [{**row, "id": "stored-id", "description": "Live jazz",
+                         "start_time": "2024-01-01T18:00:00+00:00", "end_time": "2024-01-01T23:00:00+00:00"}])
+
+    changed, unchanged = processor.split_unchanged_rows("event", [row])
+
+    assert (changed, unchanged) == ([row], [])
+    assert row["id"] == "stored-id"  # Updated in place rather than inserted as a duplicate
+
+
+def test_retry_after_committed_timeout_keeps_rows(processor, monkeypatch):
+    table = CommitThenTimeoutTable()
+    monkeypatch.setattr(pipeline, "supabase", SimpleNamespace(table=lambda name: table))
+    monkeypatch.setattr(pipeline.time, "sleep", lambda seconds: None)
+    chunk = [{"id": "bandit-1", "name": "Maria"}, {"id": "bandit-2", "name": "Nikos"}]
+
+    inserted_ids = processor.insert_chunk("bandit", chunk)
+
+    assert inserted_ids == ["bandit-1", "bandit-2"]  # The retry succeeds instead of falling back to row by row
+    assert table.requests == 2
+    assert list(table.rows) == ["bandit-1", "bandit-2"]